@@ -7,25 +7,13 @@
 3. 正确处理 Tengine CDN 防盗链
 """
 import sys
+import asyncio
 import argparse
-import os
-import sys
-import os
-import argparse
-
-# Add src to Python path to import modules
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), 'src'))
 
-from utils.logger import get_logger
-from model.proxy_manager import ProxyManager
-from model.http_client import HTTPClient
-from model.database import Database
-from downloader.file_manager import FileManager
-from scraper.category_scraper import CategoryScraper
-from scraper.list_scraper import ListScraper
-from scraper.download_scraper import DownloadScraper
-from downloader.downloader import Downloader
-from config.settings import USE_PROXY
+# 只在模块级导入轻量模块；代理/HTTP/爬虫等重模块在 IPODownloader 中按需导入，
+# 使 --help / --stats 不必加载 yaml、requests、bs4 等
+from src.utils.logger import get_logger
+from src.config.settings import USE_PROXY
 
 logger = get_logger(__name__)
 
@@ -34,6 +22,15 @@ class IPODownloader:
     """IPO报告下载器主类"""
     
     def __init__(self, use_proxy: bool = USE_PROXY):
+        from src.model.proxy_manager import ProxyManager
+        from src.model.http_client import HTTPClient
+        from src.model.database import Database
+        from src.downloader.file_manager import FileManager
+        from src.scraper.category_scraper import CategoryScraper
+        from src.scraper.list_scraper import ListScraper
+        from src.scraper.download_scraper import DownloadScraper
+        from src.downloader.downloader import Downloader
+        
         logger.info("🚀 初始化IPO报告下载器...")
         
         # 初始化代理管理器
@@ -88,26 +85,35 @@ class IPODownloader:
         """Stage 1: 爬取分类"""
         self.category_scraper.scrape_all_categories()
     
-    def stage2_scrape_lists(self, max_pages: int = None, categories: list = None):
+    def stage2_scrape_lists(self, max_pages: int = None, categories: list = None,
+                            concurrent: bool = False):
         """Stage 2: 爬取报告列表"""
         if categories:
-            # 爬取指定分类
+            scrape = (self.list_scraper.scrape_category_concurrent if concurrent
+                      else self.list_scraper.scrape_category)
+            # 爬取指定分类（分类表只查一次，按ID字典查找）
+            category_names = self.db.get_category_names()
             for category_id in categories:
-                category = self.db.get_all_categories()
-                category = [c for c in category if c['category_id'] == category_id]
-                if category:
-                    self.list_scraper.scrape_category(
-                        category[0]['category_id'],
-                        category[0]['category_name'],
-                        max_pages=max_pages
-                    )
+                if category_id not in category_names:
+                    logger.warning(f"⚠️ 未找到分类 {category_id}，请先运行 --stage1")
+                    continue
+                scrape(
+                    category_id,
+                    category_names[category_id],
+                    max_pages=max_pages
+                )
         else:
             # 爬取所有分类
-            self.list_scraper.scrape_all_categories(max_pages_per_category=max_pages)
+            self.list_scraper.scrape_all_categories(
+                max_pages_per_category=max_pages, concurrent=concurrent
+            )
     
-    def stage3_get_download_urls(self, limit: int = None):
+    def stage3_get_download_urls(self, limit: int = None, concurrent: bool = False):
         """Stage 3 & 4: 获取下载链接"""
-        self.download_scraper.process_all_pending_reports(limit=limit or 100)
+        if concurrent:
+            asyncio.run(self.download_scraper.process_all_pending_reports_async(limit=limit or 100))
+        else:
+            self.download_scraper.process_all_pending_reports(limit=limit or 100)
     
     def stage4_download_reports(self, max_reports: int = None, 
                                category: str = None,
@@ -163,20 +169,16 @@ class IPODownloader:
     
     def show_stats(self):
         """显示统计信息"""
-        stats = self.db.get_stats()
-        
-        logger.info("\n" + "=" * 60)
-        logger.info("📊 统计信息")
-        logger.info("=" * 60)
-        logger.info(f"分类数量: {stats['total_categories']}")
-        logger.info(f"报告总数: {stats['total_reports']}")
-        logger.info(f"\n按状态分布:")
-        for status, count in stats.get('reports_by_status', {}).items():
-            logger.info(f"  - {status}: {count}")
-        logger.info(f"\n下载统计:")
-        logger.info(f"  - 已完成: {stats.get('downloads_completed', 0)}")
-        logger.info(f"  - 失败: {stats.get('downloads_failed', 0)}")
-        logger.info("=" * 60)
+        print_stats(self.db)
+    
+    def test_proxy(self):
+        """经Clash端口实测一次下载链路延迟（只在 --test-proxy 时执行，不拖慢正常启动）"""
+        if not self.proxy_manager:
+            logger.warning("⚠️ 未启用代理，跳过代理链路测试")
+            return
+        latency = self.proxy_manager.test_local_proxy()
+        if latency < float('inf'):
+            logger.info(f"📡 代理链路延迟: {latency:.0f}ms")
     
     def switch_proxy_node(self) -> bool:
         """
@@ -226,6 +228,24 @@ class IPODownloader:
         self.db.close()
 
 
+def print_stats(db):
+    """显示数据库统计信息"""
+    stats = db.get_stats()
+    
+    logger.info("\n" + "=" * 60)
+    logger.info("📊 统计信息")
+    logger.info("=" * 60)
+    logger.info(f"分类数量: {stats['total_categories']}")
+    logger.info(f"报告总数: {stats['total_reports']}")
+    logger.info(f"\n按状态分布:")
+    for status, count in stats.get('reports_by_status', {}).items():
+        logger.info(f"  - {status}: {count}")
+    logger.info(f"\n下载统计:")
+    logger.info(f"  - 已完成: {stats.get('downloads_completed', 0)}")
+    logger.info(f"  - 失败: {stats.get('downloads_failed', 0)}")
+    logger.info("=" * 60)
+
+
 def main():
     """主函数"""
     parser = argparse.ArgumentParser(
@@ -260,6 +280,9 @@ def main():
   # 显示统计信息
   python main.py --stats
   
+  # 经Clash端口测试代理链路延迟
+  python main.py --test-proxy
+  
   # 不使用代理
   python main.py --full --no-proxy
 
@@ -287,6 +310,8 @@ def main():
                        help='解压已下载的ZIP文件')
     parser.add_argument('--stats', action='store_true',
                        help='显示统计信息')
+    parser.add_argument('--test-proxy', action='store_true',
+                       help='经Clash端口测试代理链路延迟')
     
     # 参数
     parser.add_argument('--max-pages', type=int,
@@ -306,22 +331,33 @@ def main():
     parser.add_argument('--force', action='store_true',
                        help='强制重新下载已存在的文件')
     parser.add_argument('--concurrent', action='store_true',
-                       help='使用并发下载（可能触发更多防护）')
+                       help='使用并发爬取列表/获取下载链接/下载（可能触发更多防护）')
     
     args = parser.parse_args()
     
     # 检查是否指定了操作
     if not any([args.full, args.stage1, args.stage2, args.stage3, 
-                args.stage4, args.retry, args.extract, args.stats]):
+                args.stage4, args.retry, args.extract, args.stats, args.test_proxy]):
         parser.print_help()
         sys.exit(0)
     
+    # 只查看统计时无需初始化代理和HTTP客户端
+    if args.stats and not any([args.full, args.stage1, args.stage2, args.stage3,
+                               args.stage4, args.retry, args.extract, args.test_proxy]):
+        from src.model.database import Database
+        with Database() as db:
+            print_stats(db)
+        return
+    
     # 初始化下载器
     downloader = None
     try:
         downloader = IPODownloader(use_proxy=not args.no_proxy)
         
         # 执行操作
+        if args.test_proxy:
+            downloader.test_proxy()
+        
         if args.stats:
             downloader.show_stats()
         
@@ -331,11 +367,12 @@ def main():
         if args.stage2:
             downloader.stage2_scrape_lists(
                 max_pages=args.max_pages,
-                categories=args.categories
+                categories=args.categories,
+                concurrent=args.concurrent
             )
         
         if args.stage3:
-            downloader.stage3_get_download_urls(limit=args.limit)
+            downloader.stage3_get_download_urls(limit=args.limit, concurrent=args.concurrent)
         
         if args.stage4:
             downloader.stage4_download_reports(
@@ -2,7 +2,9 @@
 配置管理模块
 """
 import os
+import sys
 from pathlib import Path
+from types import MappingProxyType
 
 # 项目根目录
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -11,7 +13,12 @@ BASE_DIR = Path(__file__).resolve().parent.parent
 CLASH_CONFIG_PATH = BASE_DIR / "config" / "clash_config.yaml"
 USE_PROXY = True  # 是否使用代理
 PROXY_TEST_TIMEOUT = 3  # 代理测速超时时间（秒）
+PROXY_SWEEP_TIMEOUT = 5  # 全部节点测速的总时限（秒），超时未完成的节点视为不可用
 PROXY_MAX_RETRIES = 1  # 代理重试次数
+PROXY_PROBE_URL = "http://www.gstatic.com/generate_204"  # 经本地Clash测试连通性的URL
+PROXY_LATENCY_CACHE_PATH = BASE_DIR / "data" / "proxy_latency.json"  # 节点测速结果缓存
+PROXY_LATENCY_TTL = 600  # 测速结果有效期（秒），期内启动不再重复测试
+PROXY_FAIL_COOLDOWN_MAX = 60  # 节点失败后的冷却时间上限（秒），冷却时间按 2^失败次数 增长
 
 # ===== 数据库配置 =====
 DATABASE_PATH = BASE_DIR / "data" / "downloads.db"
@@ -21,14 +28,22 @@ DATABASE_PATH.parent.mkdir(exist_ok=True)
 DOWNLOAD_DIR = BASE_DIR / "data" / "downloads"
 DOWNLOAD_DIR.mkdir(exist_ok=True)
 
-CHUNK_SIZE = 8192  # 下载块大小（字节）
+CHUNK_SIZE = 1 << 18  # 下载块大小（256 KB，减少Python层循环次数）
+ZIP_CHUNK_SIZE = 1 << 20  # 报告ZIP的拷贝块大小（1 MB，ZIP通常为数MB到上百MB）
+PAGE_CHUNK_SIZE = 1 << 14  # 边下载边解析网页时的块大小（16 KB）
+WRITE_BUFFER_SIZE = 1 << 20  # 下载文件写缓冲（1 MB）
 DOWNLOAD_TIMEOUT = 60  # 下载超时时间（秒）
 MAX_CONCURRENT_DOWNLOADS = 3  # 最大并发下载数
+DOWNLOAD_INTERVAL = 2.0  # 相邻两个报告开始下载的最小间隔（秒），下载本身耗时计入间隔
 
 # ===== 爬虫配置 =====
 REQUEST_DELAY = (1, 3)  # 请求延迟范围（秒）
 MAX_RETRIES = 1  # 最大重试次数
 RETRY_DELAY = 1.5  # 重试延迟（秒）
+SCRAPE_CONCURRENCY = 10  # 并发获取下载链接时同时进行的请求数
+SCRAPE_RATE_LIMIT = 2.0  # 并发获取下载链接时每秒最多发起的请求数
+LIST_PREFETCH_PAGES = 5  # 并发爬取列表时每批同时请求的页数
+LIST_CATEGORY_WORKERS = 4  # 并发爬取列表时同时爬取的分类数（各分类平分 SCRAPE_RATE_LIMIT）
 
 # ===== 日志配置 =====
 LOG_DIR = BASE_DIR / "logs"
@@ -50,7 +65,7 @@ INVALID_CHARS = r'<>:"/\|?*'  # Windows文件名非法字符
 MAX_FILENAME_LENGTH = 200  # 最大文件名长度
 
 # ===== 分类映射（用于创建友好的文件夹名称）=====
-CATEGORY_NAMES = {
+_CATEGORY_NAMES = {
     "70": "TMT行业",
     "53": "医药医疗器械",
     "59": "金融行业",
@@ -89,4 +104,16 @@ CATEGORY_NAMES = {
     "82": "共享经济",
     "88": "新基建",
     "54": "博彩行业",
-}
\ No newline at end of file
+}
+
+# 只读映射：导入时构建一次，键值驻留（intern）以便复用同一字符串对象
+CATEGORY_NAMES = MappingProxyType({
+    sys.intern(category_id): sys.intern(category_name)
+    for category_id, category_name in _CATEGORY_NAMES.items()
+})
+
+
+def get_category_name(category_id, default: str = None) -> str:
+    """根据分类ID获取分类名称，未知ID返回 default（默认为ID本身）"""
+    category_id = str(category_id)
+    return CATEGORY_NAMES.get(category_id, category_id if default is None else default)
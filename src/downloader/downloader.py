@@ -7,17 +7,20 @@
 3. 自动重命名文档（时间戳 + 报告标题）
 4. 支持批量下载和重试
 """
+import asyncio
 import os
+import threading
 import time
 from pathlib import Path
-from typing import Optional, List, Dict
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Optional, List, Dict, Set
 from urllib.parse import urlparse
+from tqdm import tqdm
 from src.utils.logger import get_logger
 from src.model.http_client import HTTPClient
+from src.model.async_http_client import AsyncHTTPClient, RateLimiter
 from src.model.database import Database
 from src.downloader.file_manager import FileManager
-from src.config.settings import DOWNLOAD_URL
+from src.config.settings import DOWNLOAD_INTERVAL, DOWNLOAD_URL, ZIP_CHUNK_SIZE
 
 logger = get_logger(__name__)
 
@@ -40,7 +43,8 @@ class Downloader:
                  auto_extract: bool = True,
                  auto_rename: bool = True,
                  keep_zip: bool = False,
-                 proxy_switch_callback=None):
+                 proxy_switch_callback=None,
+                 request_interval: float = DOWNLOAD_INTERVAL):
         """
         初始化下载器
         
@@ -52,6 +56,7 @@ class Downloader:
             auto_rename: 是否自动重命名文档
             keep_zip: 是否保留ZIP文件
             proxy_switch_callback: 代理切换回调函数（403时自动调用）
+            request_interval: 相邻两次访问下载页的最小间隔（秒，<=0 表示不限速）
         """
         self.client = http_client
         self.db = database
@@ -60,6 +65,17 @@ class Downloader:
         self.auto_rename = auto_rename
         self.keep_zip = keep_zip
         self.proxy_switch_callback = proxy_switch_callback
+        self.request_interval = request_interval
+        
+        # 下一次允许访问下载页的时刻（按请求开始时刻限速，并发线程共享）
+        self._next_request_time = 0.0
+        self._pace_lock = threading.Lock()
+        
+        # category_id -> category_name（精简查询不 JOIN 分类表，首次使用时加载）
+        self._category_names: Optional[Dict[str, str]] = None
+        
+        # 已下载（status='downloaded'）的 post_id，首次使用时一次性加载
+        self._downloaded_ids: Optional[Set[str]] = None
         
         # 连续失败计数（用于触发代理切换）
         self._consecutive_failures = 0
@@ -69,6 +85,37 @@ class Downloader:
         """获取下载页面URL（用作Referer）"""
         return DOWNLOAD_URL.format(post_id)
     
+    def _get_category_name(self, report) -> str:
+        """取报告的分类名：优先用查询带回的 category_name，否则按 category_id 查缓存"""
+        if 'category_name' in report.keys():
+            return report['category_name'] or 'unknown'
+        
+        if self._category_names is None:
+            self._category_names = self.db.get_category_names()
+        return self._category_names.get(report['category_id']) or 'unknown'
+    
+    def _is_marked_downloaded(self, post_id: str) -> bool:
+        """数据库中是否已标记为下载完成（集合缓存，避免逐条查询）"""
+        if self._downloaded_ids is None:
+            self._downloaded_ids = self.db.get_downloaded_post_ids()
+        return post_id in self._downloaded_ids
+    
+    def _wait_request_slot(self):
+        """
+        等待轮到下一次网络请求（间隔从上一次请求开始算起）
+        
+        取代每个报告之后固定的 sleep：下载本身超过间隔时不再额外等待，
+        跳过的报告（文件已存在、没有下载链接）也不占用间隔。
+        """
+        if self.request_interval <= 0:
+            return
+        with self._pace_lock:
+            now = time.monotonic()
+            if self._next_request_time > now:
+                time.sleep(self._next_request_time - now)
+                now = self._next_request_time
+            self._next_request_time = now + self.request_interval
+    
     def _try_switch_proxy(self, reason: str = "download failed") -> bool:
         """
         尝试切换代理节点
@@ -114,6 +161,34 @@ class Downloader:
         """重置失败计数"""
         self._consecutive_failures = 0
     
+    def _is_existing_complete(self, post_id: str, zip_url: str, save_path: Path,
+                              referer: str) -> bool:
+        """
+        本地ZIP是否已完整下载
+        
+        已标记下载完成的文件是完整的；否则 HEAD 探测远程大小，
+        识别上次中断留下的不完整文件（探测失败时沿用本地文件）
+        """
+        if not save_path.exists():
+            return False
+        file_size = save_path.stat().st_size
+        if file_size <= 1024:  # 大于1KB才认为是有效文件
+            return False
+        
+        remote_size = None
+        if not self._is_marked_downloaded(post_id):
+            remote_size = self.client.probe_content_length(zip_url, referer)
+        if remote_size is not None and remote_size != file_size:
+            logger.warning(f"⚠️ ZIP文件不完整 ({file_size}/{remote_size} 字节)，重新下载")
+            return False
+        return True
+    
+    def _mark_downloaded(self, post_id: str, save_path: str):
+        """更新数据库状态（状态与路径一条语句写入）并同步已下载集合"""
+        self.db.mark_report_downloaded(post_id, save_path)
+        if self._downloaded_ids is not None:
+            self._downloaded_ids.add(post_id)
+    
     def download_report(self, report: Dict, force: bool = False, 
                        retry_on_403: bool = True) -> bool:
         """
@@ -124,7 +199,7 @@ class Downloader:
                 - post_id: 文章ID
                 - title: 报告标题
                 - download_url: ZIP下载链接
-                - category_name: 分类名称
+                - category_name: 分类名称（缺省时按 category_id 解析）
             force: 是否强制重新下载
             retry_on_403: 遇到403时是否切换代理重试
             
@@ -133,12 +208,13 @@ class Downloader:
         """
         post_id = report['post_id']
         title = report['title']
-        zip_url = report.get('download_url')
-        category_name = report.get('category_name', 'unknown')
+        # 按键访问：兼容 dict 与 sqlite3.Row（后者没有 .get）
+        zip_url = report['download_url']
+        category_name = self._get_category_name(report)
         
-        logger.info(f"\n{'=' * 50}")
-        logger.info(f"📄 处理报告: {title}")
-        logger.info(f"{'=' * 50}")
+        logger.debug(f"\n{'=' * 50}")
+        logger.debug(f"📄 处理报告: {title}")
+        logger.debug(f"{'=' * 50}")
         
         # 检查ZIP URL是否存在
         if not zip_url:
@@ -150,25 +226,24 @@ class Downloader:
         save_path = self.fm.get_report_path(category_name, zip_filename)
         save_path_obj = Path(save_path)
         
-        logger.info(f"📂 分类: {category_name}")
-        logger.info(f"📁 保存路径: {save_path}")
-        
-        # 检查文件是否已存在
-        if not force and save_path_obj.exists():
-            file_size = save_path_obj.stat().st_size
-            if file_size > 1024:  # 大于1KB认为是有效文件
-                logger.info(f"⏭️ ZIP文件已存在，跳过下载")
-                
-                # 如果需要解压但还没解压，执行解压
-                if self.auto_extract:
-                    self._extract_and_rename(save_path_obj, title)
-                
-                self._reset_failure_count()
-                return True
+        logger.debug(f"📂 分类: {category_name}")
+        logger.debug(f"📁 保存路径: {save_path}")
         
         # 构建下载页面URL（用作Referer）
         download_page_url = self.get_download_page_url(post_id)
         
+        # 检查文件是否已存在
+        if not force and self._is_existing_complete(post_id, zip_url, save_path_obj,
+                                                    download_page_url):
+            logger.info(f"⏭️ ZIP文件已存在，跳过下载")
+            
+            # 如果需要解压但还没解压，执行解压
+            if self.auto_extract:
+                self._extract_and_rename(save_path_obj, title)
+            
+            self._reset_failure_count()
+            return True
+        
         # 最多重试次数（包括切换代理后的重试）
         max_attempts = 3 if retry_on_403 else 1
         
@@ -177,14 +252,14 @@ class Downloader:
                 if attempt > 1:
                     logger.info(f"🔄 第 {attempt} 次尝试...")
                 
+                # 限速：与上一次请求保持间隔（避免触发防护）
+                self._wait_request_slot()
+                
                 # Step 1: 访问下载页面（建立session，获取cookies）
                 logger.info(f"📄 Step 1: 访问下载页面...")
                 logger.debug(f"   URL: {download_page_url}")
                 self.client.get(download_page_url, timeout=30)
                 
-                # 短暂延迟，模拟人类行为
-                time.sleep(1)
-                
                 # Step 2: 下载ZIP文件（使用下载页面URL作为Referer）
                 logger.info(f"📥 Step 2: 下载ZIP文件...")
                 logger.debug(f"   URL: {zip_url}")
@@ -197,7 +272,9 @@ class Downloader:
                     url=zip_url,
                     save_path=save_path,
                     referer=download_page_url,  # 关键：Referer必须是ipoipo.cn域名
-                    timeout=300
+                    chunk_size=ZIP_CHUNK_SIZE,
+                    timeout=300,
+                    drop_cache=not self.auto_extract  # 自动解压时马上要读，保留页缓存
                 )
                 
                 if not success:
@@ -234,8 +311,7 @@ class Downloader:
                         logger.warning(f"⚠️ 解压失败，但ZIP文件已保存")
                 
                 # 更新数据库状态
-                self.db.update_report_status(post_id, 'downloaded')
-                self.db.update_report_local_path(post_id, save_path)
+                self._mark_downloaded(post_id, save_path)
                 
                 # 重置失败计数
                 self._reset_failure_count()
@@ -262,7 +338,7 @@ class Downloader:
         parsed = urlparse(url)
         filename = os.path.basename(parsed.path)
         
-        if filename.endswith('.zip'):
+        if filename.lower().endswith('.zip'):
             return filename
         
         # 如果URL中没有有效文件名，生成一个
@@ -383,7 +459,7 @@ class Downloader:
         logger.info("=" * 60)
         
         # 获取所有ready状态的报告
-        reports = self.db.get_ready_reports(limit=max_reports or 1000)
+        reports = self.db.get_ready_reports_minimal(limit=max_reports or 1000)
         logger.info(f"📊 待下载报告: {len(reports)} 个")
         
         if not reports:
@@ -401,8 +477,9 @@ class Downloader:
         stats = {'success': 0, 'failed': 0, 'skipped': 0}
         total = len(reports)
         
-        for i, report in enumerate(reports, 1):
-            logger.info(f"\n[{i}/{total}] 开始处理...")
+        # 进度由 tqdm 显示，逐条进度只写入 DEBUG 日志
+        for i, report in enumerate(tqdm(reports, desc="downloads", unit="report"), 1):
+            logger.debug(f"\n[{i}/{total}] 开始处理...")
             
             try:
                 success = self.download_report(report, force=force)
@@ -415,11 +492,6 @@ class Downloader:
             except Exception as e:
                 logger.error(f"❌ 处理异常: {e}")
                 stats['failed'] += 1
-            
-            # 下载间隔（重要：避免触发防护）
-            if i < total:
-                logger.info("⏳ 等待2秒后继续...")
-                time.sleep(2)
         
         self._print_stats(stats)
         return stats
@@ -428,31 +500,134 @@ class Downloader:
                             force: bool = False,
                             max_workers: int = 3) -> Dict[str, int]:
         """
-        并发下载
+        并发下载（在同步代码中调用 _download_concurrent_async）
         
         注意：并发下载时可能触发更多防护，建议谨慎使用
         """
         logger.warning("⚠️ 并发下载可能触发防盗链，如失败请改用顺序下载")
+        return asyncio.run(self._download_concurrent_async(reports, force, max_workers))
+    
+    async def _download_concurrent_async(self, reports: List[Dict],
+                                         force: bool = False,
+                                         max_workers: int = 3) -> Dict[str, int]:
+        """
+        并发下载（aiohttp + aiofiles）：一个事件循环内同时进行 max_workers 个下载
         
+        每个报告同样先访问下载页（cookies 存入共享会话），再以下载页为 Referer 下载ZIP，
+        遇到403时与 download_report 一样切换代理节点后重试。
+        访问下载页的开始时刻按 request_interval 限速；数据库写入、解压等同步操作
+        放到默认线程池执行，不阻塞事件循环。
+        """
         stats = {'success': 0, 'failed': 0, 'skipped': 0}
         
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            future_to_report = {
-                executor.submit(self.download_report, report, force): report 
-                for report in reports
-            }
+        loop = asyncio.get_running_loop()
+        client = AsyncHTTPClient.from_http_client(self.client)
+        limiter = RateLimiter(1.0 / self.request_interval if self.request_interval > 0 else 0)
+        semaphore = asyncio.Semaphore(max_workers)
+        switch_lock = asyncio.Lock()
+        proxy_generation = 0  # 每切换一次代理节点 +1
+        
+        def run_sync(func, *args):
+            """在默认线程池中执行同步调用"""
+            return loop.run_in_executor(None, func, *args)
+        
+        async def handle_failure(session, is_403: bool, seen_generation: int) -> bool:
+            """
+            记录一次失败并按需切换代理节点，返回是否应该重试
+            
+            切换串行进行；失败期间其他下载已切换过节点时不再重复切换，直接重试。
+            """
+            nonlocal proxy_generation
+            async with switch_lock:
+                if proxy_generation != seen_generation:
+                    return True
+                if not await run_sync(self._handle_download_failure, is_403):
+                    return False
+                proxy_generation += 1
+                # 与同步客户端一致：新节点清空旧cookies，并沿用切换后的代理地址
+                session.cookie_jar.clear()
+                proxies = self.client.session.proxies or {}
+                client.proxy = proxies.get('https') or proxies.get('http')
+                return True
+        
+        async def download_one(session, report) -> bool:
+            post_id = report['post_id']
+            title = report['title']
+            zip_url = report['download_url']
+            
+            if not zip_url:
+                logger.warning(f"⚠️ 没有下载链接: {post_id}")
+                return False
+            
+            save_path = self.fm.get_report_path(
+                self._get_category_name(report), self._extract_filename_from_url(zip_url)
+            )
+            save_path_obj = Path(save_path)
+            download_page_url = self.get_download_page_url(post_id)
             
-            for future in as_completed(future_to_report):
-                report = future_to_report[future]
-                try:
-                    success = future.result()
+            async with semaphore:
+                if not force and await run_sync(
+                        self._is_existing_complete, post_id, zip_url, save_path_obj,
+                        download_page_url):
+                    logger.info(f"⏭️ ZIP文件已存在，跳过下载: {title}")
+                    if self.auto_extract:
+                        await run_sync(self._extract_and_rename, save_path_obj, title)
+                    return True
+                
+                # 最多重试次数（包括切换代理后的重试）
+                max_attempts = 3
+                success = False
+                for attempt in range(1, max_attempts + 1):
+                    if attempt > 1:
+                        logger.info(f"🔄 第 {attempt} 次尝试: {title}")
+                    seen_generation = proxy_generation
+                    
+                    # Step 1: 访问下载页面（建立session，获取cookies）
+                    status = None
+                    if await client.fetch_text(session, download_page_url, limiter) is not None:
+                        # Step 2: 下载ZIP文件（使用下载页面URL作为Referer）
+                        await run_sync(self.fm.ensure_directory, save_path)
+                        status = await client.fetch_file(session, zip_url, save_path,
+                                                         referer=download_page_url)
+                    
+                    success = (status is not None and status < 400
+                               and save_path_obj.exists()
+                               and save_path_obj.stat().st_size >= 1024)
                     if success:
-                        stats['success'] += 1
-                    else:
+                        break
+                    
+                    retry = await handle_failure(session, status == 403, seen_generation)
+                    if not retry or attempt >= max_attempts:
+                        break
+            
+            if not success:
+                logger.error(f"❌ 下载失败: {title}")
+                await run_sync(self.db.update_report_status, post_id, 'failed')
+                return False
+            
+            self._reset_failure_count()
+            
+            # Step 3: 解压和重命名
+            if self.auto_extract:
+                if not await run_sync(self._extract_and_rename, save_path_obj, title):
+                    logger.warning(f"⚠️ 解压失败，但ZIP文件已保存")
+            
+            await run_sync(self._mark_downloaded, post_id, save_path)
+            return True
+        
+        async with client.create_session() as session:
+            tasks = [asyncio.ensure_future(download_one(session, report)) for report in reports]
+            with tqdm(total=len(reports), desc="downloads", unit="report") as progress:
+                for task in asyncio.as_completed(tasks):
+                    try:
+                        if await task:
+                            stats['success'] += 1
+                        else:
+                            stats['failed'] += 1
+                    except Exception as e:
+                        logger.error(f"❌ 下载异常: {e}")
                         stats['failed'] += 1
-                except Exception as e:
-                    logger.error(f"❌ 下载异常: {report['title']} - {e}")
-                    stats['failed'] += 1
+                    progress.update(1)
         
         self._print_stats(stats)
         return stats
@@ -484,9 +659,10 @@ class Downloader:
             logger.info("✅ 没有失败的下载需要重试")
             return {'success': 0, 'failed': 0, 'skipped': 0}
         
-        # 重置状态为ready
-        for report in reports:
-            self.db.update_report_status(report['post_id'], 'ready')
+        # 重置状态为ready（一条语句批量更新）
+        self.db.update_report_statuses(
+            (report['post_id'], 'ready') for report in reports
+        )
         
         # 重新下载（强制模式）
         return self._download_sequential(reports, force=True)
@@ -511,7 +687,7 @@ class Downloader:
         reports = self.db.get_downloaded_reports(limit=max_files or 1000)
         
         if category_name:
-            reports = [r for r in reports if r.get('category_name') == category_name]
+            reports = [r for r in reports if r['category_name'] == category_name]
         
         logger.info(f"📊 待处理报告: {len(reports)} 个")
         
@@ -519,7 +695,7 @@ class Downloader:
         
         for i, report in enumerate(reports, 1):
             title = report['title']
-            local_path = report.get('local_path')
+            local_path = report['local_path']
             
             if not local_path:
                 logger.warning(f"⚠️ [{i}] 没有本地路径: {title}")
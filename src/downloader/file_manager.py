@@ -12,8 +12,8 @@ from typing import Optional, List, Tuple
 from datetime import datetime
 from src.utils.logger import get_logger
 from src.config.settings import (
-    DOWNLOAD_DIR, INVALID_CHARS, MAX_FILENAME_LENGTH,
-    CATEGORY_NAMES
+    DOWNLOAD_DIR, MAX_FILENAME_LENGTH,
+    get_category_name
 )
 
 logger = get_logger(__name__)
@@ -22,8 +22,11 @@ logger = get_logger(__name__)
 class FileManager:
     """文件管理器"""
     
-    # 扩展的非法字符集（包括中文标点）
-    ILLEGAL_CHARS = r'[<>:"/\\|?*【】（）《》""''：；，。！？\[\]]'
+    # 预编译的清理正则：Windows非法字符、控制字符及中文标点
+    _ILLEGAL_CHARS_RE = re.compile(r'[\x00-\x1f<>:"/\\|?*【】（）《》""：；，。！？\[\]]')
+    _SEPARATOR_RUN_RE = re.compile(r'[_\s.]+')
+    _NON_WORD_RE = re.compile(r'[^\w\u4e00-\u9fff]+')
+    _UNDERSCORE_RUN_RE = re.compile(r'_+')
     
     # 支持的文档扩展名
     DOCUMENT_EXTENSIONS = {'.pdf', '.docx', '.doc', '.pptx', '.ppt', '.xlsx', '.xls'}
@@ -46,22 +49,18 @@ class FileManager:
         else:
             name, ext = filename, ''
         
-        # 移除或替换非法字符
-        name = re.sub(self.ILLEGAL_CHARS, '_', name)
-        
-        # 替换中文括号为下划线
-        name = name.replace('（', '_').replace('）', '_')
-        name = name.replace('【', '_').replace('】', '_')
+        # 移除或替换非法字符（含中文括号）
+        name = self._ILLEGAL_CHARS_RE.sub('_', name)
         
         # 移除多余的空格、下划线和点
-        name = re.sub(r'[_\s.]+', '_', name)
+        name = self._SEPARATOR_RUN_RE.sub('_', name)
         name = name.strip('_. ')
         
         # 如果是文件夹，进一步清理
         if is_folder:
             # 只保留字母、数字、中文、下划线
-            name = re.sub(r'[^\w\u4e00-\u9fff]+', '_', name)
-            name = re.sub(r'_+', '_', name)
+            name = self._NON_WORD_RE.sub('_', name)
+            name = self._UNDERSCORE_RUN_RE.sub('_', name)
         
         # 限制长度
         max_len = MAX_FILENAME_LENGTH - len(ext) if ext else MAX_FILENAME_LENGTH
@@ -94,7 +93,7 @@ class FileManager:
         Args:
             category_id: 分类ID（如 "34"）
         """
-        category_name = CATEGORY_NAMES.get(category_id, f"category_{category_id}")
+        category_name = get_category_name(category_id, f"category_{category_id}")
         return self.get_category_dir(category_name)
     
     def get_report_path(self, category_name: str, filename: str) -> str:
@@ -128,7 +127,7 @@ class FileManager:
         Returns:
             完整的文件路径字符串
         """
-        category_name = CATEGORY_NAMES.get(category_id, f"category_{category_id}")
+        category_name = get_category_name(category_id, f"category_{category_id}")
         return self.get_report_path(category_name, filename)
     
     def get_report_dir(self, category_id: str, report_title: str) -> Path:
@@ -0,0 +1,255 @@
+"""
+异步HTTP客户端 - 基于aiohttp的批量并发下载
+
+同一个事件循环内并发多个下载，替代"一个线程一个文件"的同步模式。
+防盗链要求与同步客户端相同：需要携带下载页建立的cookies，Referer 必须是 ipoipo.cn 域名，
+因此通常通过 AsyncHTTPClient.from_http_client() 从已访问过下载页的 HTTPClient 继承会话状态。
+"""
+import asyncio
+import os
+import time
+from typing import Dict, Optional
+
+import aiofiles
+import aiohttp
+
+from src.utils.logger import get_logger
+from src.model.http_client import HTTPClient
+from src.config.settings import (
+    DOWNLOAD_TIMEOUT, MAX_RETRIES, RETRY_DELAY, ZIP_CHUNK_SIZE
+)
+
+logger = get_logger(__name__)
+
+# 与同步客户端的 Retry 策略一致：这些状态码退避后重试
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+# 429 自适应降速后，两次请求之间的最长间隔（秒）
+RATE_LIMIT_MAX_INTERVAL = 10.0
+# 降速后每个成功的请求把间隔除以该系数，逐步恢复到初始速率
+RATE_LIMIT_RECOVERY = 1.1
+
+
+class RateLimiter:
+    """
+    按固定速率放行请求（容量为1的令牌桶）
+    
+    并发请求共享一个 RateLimiter，请求的发起时刻被均匀摊开，
+    取代逐个请求之间阻塞式的 time.sleep。
+    服务器返回 429 时降速（同一批在途请求的 429 只降一次），之后的成功请求逐步恢复速率。
+    """
+    
+    def __init__(self, rate: float):
+        """
+        Args:
+            rate: 每秒最多放行的请求数（<=0 表示不限速）
+        """
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._base_interval = self.interval
+        self._next_time = 0.0
+        self._slowed_at = 0.0  # 最近一次降速的时刻
+        self._lock = asyncio.Lock()
+    
+    async def wait(self) -> float:
+        """
+        等待轮到下一个请求
+        
+        Returns:
+            放行时刻（time.monotonic()），429 时传给 slow_down
+        """
+        if not self.interval:
+            return time.monotonic()
+        async with self._lock:
+            now = time.monotonic()
+            if self._next_time > now:
+                await asyncio.sleep(self._next_time - now)
+                now = self._next_time
+            self._next_time = now + self.interval
+            return now
+    
+    def slow_down(self, sent_at: float, factor: float = 2.0):
+        """
+        服务器返回 429 时降低放行速率（间隔乘以 factor，上限为 RATE_LIMIT_MAX_INTERVAL 秒）
+        
+        Args:
+            sent_at: 收到 429 的请求的放行时刻（wait() 的返回值）；
+                早于上次降速的请求是按旧速率发出的，它们的 429 不再重复降速
+            factor: 间隔放大倍数
+        """
+        if not self.interval or sent_at < self._slowed_at:
+            return
+        self._slowed_at = time.monotonic()
+        self.interval = min(self.interval * factor, RATE_LIMIT_MAX_INTERVAL)
+        logger.warning(f"🐢 触发限流，请求速率降为 {1.0 / self.interval:.2f}/s")
+    
+    def recover(self):
+        """请求成功：降速后的间隔逐步缩回初始值"""
+        if self.interval > self._base_interval:
+            self.interval = max(self.interval / RATE_LIMIT_RECOVERY, self._base_interval)
+
+
+class AsyncHTTPClient:
+    """
+    异步HTTP客户端 - 在共享会话上并发获取页面和ZIP文件
+
+    用法（并发调度、限速与403切换代理见 Downloader._download_concurrent_async）：
+        client = AsyncHTTPClient.from_http_client(http_client)
+        async with client.create_session() as session:
+            await client.fetch_text(session, download_page_url, limiter)
+            status = await client.fetch_file(session, zip_url, save_path, referer=download_page_url)
+    """
+
+    # 连接池上限（总数 / 每个主机）
+    MAX_CONNECTIONS = 64
+    MAX_CONNECTIONS_PER_HOST = 32
+
+    def __init__(self, headers: Dict[str, str] = None, cookies: Dict[str, str] = None,
+                 proxy: str = None, timeout: int = DOWNLOAD_TIMEOUT,
+                 max_retries: int = MAX_RETRIES):
+        """
+        初始化异步客户端
+
+        Args:
+            headers: 默认请求头
+            cookies: 初始cookies（防盗链需要下载页建立的会话）
+            proxy: 代理URL（如 "http://127.0.0.1:7890"）
+            timeout: 连接/读取超时（秒），不限制整个文件的下载时长
+            max_retries: fetch_text 遇到 429/5xx 或连接错误时的重试次数
+        """
+        self.headers = dict(headers or HTTPClient.DEFAULT_HEADERS)
+        self.cookies = dict(cookies or {})
+        self.proxy = proxy
+        self.timeout = timeout
+        self.max_retries = max_retries
+
+    @classmethod
+    def from_http_client(cls, client: HTTPClient, **kwargs) -> 'AsyncHTTPClient':
+        """从同步 HTTPClient 继承请求头、cookies 和代理"""
+        proxies = client.session.proxies or {}
+        return cls(
+            headers=dict(client.session.headers),
+            cookies=client.get_cookies(),
+            proxy=proxies.get('https') or proxies.get('http'),
+            max_retries=client.max_retries,
+            **kwargs
+        )
+
+    def create_session(self) -> aiohttp.ClientSession:
+        """创建带连接池的会话"""
+        connector = aiohttp.TCPConnector(
+            limit=self.MAX_CONNECTIONS,
+            limit_per_host=self.MAX_CONNECTIONS_PER_HOST
+        )
+        timeout = aiohttp.ClientTimeout(
+            total=None, sock_connect=self.timeout, sock_read=self.timeout
+        )
+        return aiohttp.ClientSession(
+            connector=connector,
+            timeout=timeout,
+            headers=self.headers,
+            cookies=self.cookies
+        )
+
+    async def fetch_text(self, session: aiohttp.ClientSession, url: str,
+                         limiter: RateLimiter = None) -> Optional[str]:
+        """
+        GET 一个页面并返回文本（429/5xx 与连接错误按指数退避重试）
+        
+        Args:
+            session: 共享的 aiohttp 会话
+            url: 页面URL
+            limiter: 限速器（每次发起请求前等待，包括重试）
+            
+        Returns:
+            页面内容，失败返回 None
+        """
+        for attempt in range(self.max_retries + 1):
+            sent_at = await limiter.wait() if limiter else 0.0
+            
+            try:
+                async with session.get(url, proxy=self.proxy, allow_redirects=True) as response:
+                    if response.status < 400:
+                        if limiter:
+                            limiter.recover()
+                        return await response.text()
+                    if response.status == 429 and limiter:
+                        limiter.slow_down(sent_at)
+                    # 其余 4xx（如403防盗链）重试无意义
+                    if response.status not in RETRY_STATUSES or attempt >= self.max_retries:
+                        logger.warning(f"⚠️ 请求失败: HTTP {response.status} - {url}")
+                        return None
+                    logger.warning(f"⚠️ HTTP {response.status}，稍后重试: {url}")
+                        
+            except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                if attempt >= self.max_retries:
+                    logger.error(f"❌ 请求失败,已重试 {self.max_retries} 次: {url} - {e}")
+                    return None
+                logger.warning(f"⚠️ 请求失败，稍后重试: {url} - {e}")
+            
+            await asyncio.sleep(RETRY_DELAY * (2 ** attempt))
+        
+        return None
+    
+    async def fetch_file(self, session: aiohttp.ClientSession, url: str,
+                         save_path: str, referer: str = None) -> Optional[int]:
+        """
+        下载单个文件并返回HTTP状态码（供调用方区分403防盗链与其他失败）
+
+        先写入 <save_path>.part，字节数与 Content-Length 核对无误后再原子替换为正式文件，
+        中断或不完整的下载不会留下"看起来完整"的ZIP。
+
+        Returns:
+            HTTP状态码（返回HTML而不是ZIP时按403处理），连接错误或下载不完整返回 None
+        """
+        headers = HTTPClient._get_download_headers(referer)
+
+        logger.info(f"📥 开始下载: {url}")
+
+        try:
+            async with session.get(url, headers=headers, proxy=self.proxy,
+                                   allow_redirects=True) as response:
+                if response.status == 403:
+                    logger.error(f"❌ 403 Forbidden - 防盗链拦截: {url}")
+                    tengine_error = response.headers.get('X-Tengine-Error', '')
+                    if tengine_error:
+                        logger.error(f"   X-Tengine-Error: {tengine_error}")
+                    return response.status
+
+                if response.status >= 400:
+                    logger.error(f"❌ 下载失败: HTTP {response.status} - {url}")
+                    return response.status
+
+                # 验证内容类型（防止返回HTML错误页面）
+                content_type = response.headers.get('Content-Type', '')
+                if 'text/html' in content_type.lower() and url.endswith('.zip'):
+                    logger.error(f"❌ 返回的是HTML而不是ZIP文件，可能是防盗链拦截: {url}")
+                    return 403
+
+                os.makedirs(os.path.dirname(save_path) or '.', exist_ok=True)
+
+                part_path = save_path + '.part'
+                # 压缩传输时 Content-Length 是压缩后的长度（aiohttp 已解压），不能用来核对
+                expected_size = response.content_length if response.headers.get(
+                    'Content-Encoding', 'identity').lower() == 'identity' else None
+                downloaded = 0
+                try:
+                    async with aiofiles.open(part_path, 'wb') as f:
+                        async for chunk in response.content.iter_chunked(ZIP_CHUNK_SIZE):
+                            await f.write(chunk)
+                            downloaded += len(chunk)
+
+                    if expected_size and downloaded != expected_size:
+                        logger.error(f"❌ 下载不完整 ({downloaded}/{expected_size} 字节): {url}")
+                        os.remove(part_path)
+                        return None
+                    os.replace(part_path, save_path)
+                except BaseException:
+                    if os.path.exists(part_path):
+                        os.remove(part_path)
+                    raise
+
+            logger.info(f"✅ 下载完成: {save_path}")
+            return response.status
+
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logger.error(f"❌ 下载失败: {url} - {e}")
+            return None
@@ -4,160 +4,565 @@
 新增方法：
 - get_ready_reports(): 获取ready状态的报告
 - get_failed_reports(): 获取失败的报告
+- iter_ready_reports() 等: 按id分页流式读取报告
 - update_report_local_path(): 更新本地文件路径
+- mark_report_downloaded(): 同时写入已下载状态和本地路径
 - get_reports_with_category(): 获取报告及分类名称
 """
 import sqlite3
-import json
-from datetime import datetime
-from typing import List, Optional, Dict
-from pathlib import Path
+import threading
+import weakref
+from contextlib import contextmanager, nullcontext
 import sys
-import os
-# Add src to path to import modules
-sys.path.insert(0, os.path.join(os.path.dirname(__file__), '../../'))
+from typing import List, Optional, Dict, Iterable, Iterator, Set, Tuple
 
 from src.utils.logger import get_logger
 from src.config.settings import DATABASE_PATH
 
 logger = get_logger(__name__)
 
+# 内存映射大小：64 位进程 1 GB，32 位进程地址空间有限保持 256 MB
+_MMAP_SIZE = (1 << 30) if sys.maxsize > 2 ** 32 else (1 << 28)
+
+# 连接级 PRAGMA（journal_mode=WAL 单独设置，见 Database._apply_pragmas）
+SQLITE_PRAGMAS = (
+    'PRAGMA synchronous=NORMAL',     # WAL 下崩溃安全，仅断电可能丢最后一个事务
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-65536',      # 64 MB 页缓存
+    f'PRAGMA mmap_size={_MMAP_SIZE}',  # 内存映射读，扫描时直接访问OS页缓存
+    'PRAGMA busy_timeout=5000',      # 锁等待 5 秒而不是立即 SQLITE_BUSY
+    'PRAGMA wal_autocheckpoint=1000',  # 每 1000 页 checkpoint 一次，避免 WAL 无限增长
+)
+
+# 当前时间（Unix epoch 秒，INTEGER），所有时间戳列统一使用
+_NOW_EPOCH = "CAST(strftime('%s', 'now') AS INTEGER)"
+
+# 每条报告都会执行的热点语句：固定SQL文本以命中 sqlite3 的语句缓存
+# 插入时显式写入时间戳：旧库的列默认值仍是 CURRENT_TIMESTAMP 文本
+_SQL_INSERT_CATEGORY = (
+    'INSERT OR IGNORE INTO categories (category_id, category_name, url, created_at) '
+    f'VALUES (?, ?, ?, {_NOW_EPOCH})'
+)
+_REPORT_INSERT_PREFIX = (
+    'INSERT OR IGNORE INTO reports '
+    '(category_id, post_id, title, detail_url, thumbnail_url, view_count, publish_date, '
+    'created_at, updated_at) VALUES '
+)
+_REPORT_INSERT_VALUES = f'(?, ?, ?, ?, ?, ?, ?, {_NOW_EPOCH}, {_NOW_EPOCH})'
+_SQL_INSERT_REPORT = _REPORT_INSERT_PREFIX + _REPORT_INSERT_VALUES
+
+# 表结构（IF NOT EXISTS 保证幂等），由 init_schema() 一次 executescript 执行
+# 时间戳列存 INTEGER epoch（比 ISO8601 文本更小、比较更快），可读格式见视图 reports_v
+_SCHEMA_SQL = '''
+-- 分类表
+CREATE TABLE IF NOT EXISTS categories (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    category_id TEXT UNIQUE NOT NULL,
+    category_name TEXT NOT NULL,
+    url TEXT NOT NULL,
+    created_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER))
+);
+
+-- 报告列表表（新增 local_path 字段）
+-- 注：保持 rowid 表。id 是所有列表查询的排序键（ORDER BY r.id），
+-- 改为 post_id 主键的 WITHOUT ROWID 表会丢失插入顺序
+CREATE TABLE IF NOT EXISTS reports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    category_id TEXT NOT NULL,
+    post_id TEXT UNIQUE NOT NULL,
+    title TEXT NOT NULL,
+    detail_url TEXT NOT NULL,
+    download_url TEXT,
+    thumbnail_url TEXT,
+    view_count INTEGER DEFAULT 0,
+    publish_date TEXT,
+    status TEXT DEFAULT 'pending',
+    local_path TEXT,
+    created_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+    updated_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+    FOREIGN KEY (category_id) REFERENCES categories(category_id)
+);
+
+-- 下载记录表
+-- 注：同一 post_id 可有多条记录（重试），且 id 由 lastrowid 返回并被
+-- extractions 引用，因此不能改为以 post_id 为主键的 WITHOUT ROWID 表
+CREATE TABLE IF NOT EXISTS downloads (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    post_id TEXT NOT NULL,
+    zip_url TEXT NOT NULL,
+    file_name TEXT,
+    file_path TEXT,
+    file_size INTEGER DEFAULT 0,
+    status TEXT DEFAULT 'pending',
+    download_attempts INTEGER DEFAULT 0,
+    error_message TEXT,
+    started_at INTEGER,
+    completed_at INTEGER,
+    created_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+    FOREIGN KEY (post_id) REFERENCES reports(post_id)
+);
+
+-- 解压记录表
+CREATE TABLE IF NOT EXISTS extractions (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    download_id INTEGER NOT NULL,
+    extract_path TEXT NOT NULL,
+    files_count INTEGER DEFAULT 0,
+    status TEXT DEFAULT 'pending',
+    extracted_at INTEGER,
+    created_at INTEGER DEFAULT (CAST(strftime('%s', 'now') AS INTEGER)),
+    FOREIGN KEY (download_id) REFERENCES downloads(id)
+);
+'''
+
+# 旧库时间戳为 CURRENT_TIMESTAMP 文本，一次性转换为 epoch（PRAGMA user_version 记录已迁移）
+_EPOCH_SCHEMA_VERSION = 1
+_MIGRATE_EPOCH_SQL = '''
+UPDATE categories SET created_at = CAST(strftime('%s', created_at) AS INTEGER)
+    WHERE typeof(created_at) = 'text';
+UPDATE reports SET created_at = CAST(strftime('%s', created_at) AS INTEGER)
+    WHERE typeof(created_at) = 'text';
+UPDATE reports SET updated_at = CAST(strftime('%s', updated_at) AS INTEGER)
+    WHERE typeof(updated_at) = 'text';
+UPDATE downloads SET started_at = CAST(strftime('%s', started_at) AS INTEGER)
+    WHERE typeof(started_at) = 'text';
+UPDATE downloads SET completed_at = CAST(strftime('%s', completed_at) AS INTEGER)
+    WHERE typeof(completed_at) = 'text';
+UPDATE downloads SET created_at = CAST(strftime('%s', created_at) AS INTEGER)
+    WHERE typeof(created_at) = 'text';
+UPDATE extractions SET extracted_at = CAST(strftime('%s', extracted_at) AS INTEGER)
+    WHERE typeof(extracted_at) = 'text';
+UPDATE extractions SET created_at = CAST(strftime('%s', created_at) AS INTEGER)
+    WHERE typeof(created_at) = 'text';
+PRAGMA user_version = 1;
+'''
+
+# 供人工查看的报告视图（epoch 转为本地可读时间），只在迁移时建一次：
+# 每次打开都重建视图会改动 schema cookie，使其他连接缓存的语句全部失效
+# 先 DROP 再建：版本 1 的库中视图按 UTC 显示，需要随定义更新
+_VIEW_SCHEMA_VERSION = 2
+_CREATE_REPORTS_VIEW_SQL = '''
+DROP VIEW IF EXISTS reports_v;
+CREATE VIEW reports_v AS
+SELECT *,
+       datetime(created_at, 'unixepoch', 'localtime') AS created_at_iso,
+       datetime(updated_at, 'unixepoch', 'localtime') AS updated_at_iso
+FROM reports;
+PRAGMA user_version = 2;
+'''
+
+# 二级索引，由 finalize_indexes() 在首批数据入库后一次执行
+_INDEX_SQL = '''
+-- (category_id, status) 覆盖按分类+状态筛选，取代原 idx_reports_category；
+-- 索引项隐含 rowid 后缀，同一分类+状态内已按 id 有序，无需再声明 id 列
+DROP INDEX IF EXISTS idx_reports_category;
+DROP INDEX IF EXISTS idx_reports_cat_status_id;
+CREATE INDEX IF NOT EXISTS idx_reports_cat_status ON reports(category_id, status);
+
+-- idx_reports_status 隐含 rowid 后缀，按状态筛选时已按 id 有序输出
+CREATE INDEX IF NOT EXISTS idx_reports_status ON reports(status);
+
+-- 只索引已有下载链接的报告，供 get_ready_reports / get_failed_reports 使用
+-- （post_id 查询走 UNIQUE 约束自带的自动索引，无需另建）
+CREATE INDEX IF NOT EXISTS idx_reports_status_url ON reports(status)
+    WHERE download_url IS NOT NULL AND download_url != '';
+
+-- 只索引未完成的下载记录（待派发队列），按 id 顺序输出
+DROP INDEX IF EXISTS idx_downloads_status;
+CREATE INDEX IF NOT EXISTS idx_downloads_pending
+    ON downloads(id, post_id) WHERE status IN ('pending', 'failed');
+
+CREATE INDEX IF NOT EXISTS idx_downloads_post_id ON downloads(post_id);
+CREATE INDEX IF NOT EXISTS idx_downloads_completed
+    ON downloads(post_id) WHERE status = 'completed';
+'''
+
+# _INDEX_SQL 建立的全部索引名，用于判断索引是否已建好
+_INDEX_NAMES = (
+    'idx_reports_cat_status', 'idx_reports_status', 'idx_reports_status_url',
+    'idx_downloads_pending', 'idx_downloads_post_id', 'idx_downloads_completed',
+)
+_SQL_COUNT_INDEXES = (
+    "SELECT COUNT(*) FROM sqlite_master WHERE type = 'index' "
+    f"AND name IN ({','.join('?' * len(_INDEX_NAMES))})"
+)
+
+# 显式列清单（不使用 SELECT *）
+_CATEGORY_COLUMNS = 'category_id, category_name, url'
+_REPORT_COLUMNS = (
+    'id, category_id, post_id, title, detail_url, download_url, thumbnail_url, '
+    'view_count, publish_date, status, local_path, created_at, updated_at'
+)
+_DOWNLOAD_COLUMNS = (
+    'id, post_id, zip_url, file_name, file_path, file_size, status, '
+    'download_attempts, error_message, started_at, completed_at'
+)
+
+# 热点列表查询只取爬取/下载流程实际用到的列
+_REPORT_ROW_COLUMNS = (
+    'r.id, r.category_id, r.post_id, r.title, r.detail_url, '
+    'r.download_url, r.status, r.local_path, c.category_name'
+)
+
+# 下载流程只需的最少列（不 JOIN categories，分类名由调用方按 category_id 解析）
+_REPORT_MIN_COLUMNS = 'r.id, r.post_id, r.title, r.download_url, r.category_id'
+
+# 多行 VALUES 批量插入：每行7个参数，100行=700个参数，低于SQLite默认上限999
+_BULK_INSERT_CHUNK = 100
+_BULK_INSERT_SQL: Dict[int, str] = {}
+
+
+def _bulk_insert_report_sql(n: int) -> str:
+    """生成（并缓存）一次插入 n 行报告的SQL"""
+    sql = _BULK_INSERT_SQL.get(n)
+    if sql is None:
+        sql = _BULK_INSERT_SQL[n] = (
+            _REPORT_INSERT_PREFIX + ','.join([_REPORT_INSERT_VALUES] * n)
+        )
+    return sql
+
+
+# iter_* 方法按 id 分页读取，每页一条短查询
+_ITER_PAGE_SIZE = 200
+
+# 报告列表的过滤条件（引用 reports 别名 r）
+_WHERE_READY = "r.status = 'ready' AND r.download_url IS NOT NULL AND r.download_url != ''"
+_WHERE_FAILED = "r.status = 'failed' AND r.download_url IS NOT NULL AND r.download_url != ''"
+_WHERE_DOWNLOADED = "r.status = 'downloaded'"
+_WHERE_STATUS = 'r.status = ?'
+
+
+def _fetch_rows(rows: Iterable[sqlite3.Row], as_dict: bool = False) -> List:
+    """取出全部结果行：默认直接返回 sqlite3.Row，as_dict=True 时转为dict（兼容旧调用）"""
+    if as_dict:
+        return [dict(row) for row in rows]
+    return list(rows)
+
+
+_SQL_UPDATE_REPORT_DOWNLOAD_URL = (
+    f'UPDATE reports SET download_url = ?, updated_at = {_NOW_EPOCH} WHERE post_id = ?'
+)
+_SQL_UPDATE_REPORT_LOCAL_PATH = (
+    f'UPDATE reports SET local_path = ?, updated_at = {_NOW_EPOCH} WHERE post_id = ?'
+)
+_SQL_UPDATE_REPORT_STATUS = (
+    f'UPDATE reports SET status = ?, updated_at = {_NOW_EPOCH} WHERE post_id = ?'
+)
+# download_url 为 NULL 时保留原值（获取链接失败的报告只更新状态）
+_SQL_UPDATE_REPORT_LINK = (
+    'UPDATE reports SET download_url = COALESCE(?, download_url), status = ?, '
+    f'updated_at = {_NOW_EPOCH} WHERE post_id = ?'
+)
+_SQL_MARK_REPORT_DOWNLOADED = (
+    "UPDATE reports SET status = 'downloaded', local_path = ?, "
+    f'updated_at = {_NOW_EPOCH} WHERE post_id = ?'
+)
+_SQL_GET_REPORT_BY_POST_ID = f'SELECT {_REPORT_COLUMNS} FROM reports WHERE post_id = ?'
+_SQL_INSERT_DOWNLOAD = (
+    'INSERT INTO downloads (post_id, zip_url, file_name, started_at, created_at) '
+    f'VALUES (?, ?, ?, {_NOW_EPOCH}, {_NOW_EPOCH})'
+)
+_SQL_UPDATE_DOWNLOAD_COMPLETED = (
+    'UPDATE downloads SET status = ?, file_path = ?, file_size = ?, '
+    f'completed_at = {_NOW_EPOCH} WHERE id = ?'
+)
+_SQL_UPDATE_DOWNLOAD_FAILED = (
+    'UPDATE downloads SET status = ?, error_message = ?, '
+    'download_attempts = download_attempts + 1 WHERE id = ?'
+)
+_SQL_UPDATE_DOWNLOAD_STATUS = 'UPDATE downloads SET status = ? WHERE id = ?'
+_SQL_GET_DOWNLOAD_BY_POST_ID = (
+    f'SELECT {_DOWNLOAD_COLUMNS} FROM downloads WHERE post_id = ? ORDER BY id DESC LIMIT 1'
+)
+_SQL_IS_DOWNLOADED = (
+    "SELECT 1 FROM downloads WHERE post_id = ? AND status = 'completed' LIMIT 1"
+)
+
+
+def _discard_connection(conn: sqlite3.Connection, conns: List[sqlite3.Connection],
+                        lock: threading.Lock):
+    """关闭连接并从连接登记表中移除"""
+    with lock:
+        if conn in conns:
+            conns.remove(conn)
+    conn.close()
+
+
+class _ThreadToken:
+    """放在线程本地数据中的哨兵：线程结束时随之释放，触发关闭该线程的连接"""
+
+
+class _ThreadConnection(threading.local):
+    """
+    线程本地连接：每个线程首次访问时调用 opener 建立自己的连接
+    
+    线程结束时连接随即关闭，不会一直占着页缓存和内存映射直到 Database.close()
+    （asyncio 默认线程池、ThreadPoolExecutor 会不断创建新线程）。
+    """
+    
+    def __init__(self, opener, conns: List[sqlite3.Connection], lock: threading.Lock):
+        self.conn = opener()
+        self._token = _ThreadToken()
+        weakref.finalize(self._token, _discard_connection, self.conn, conns, lock)
+
 
 class Database:
-    """数据库管理器"""
+    """
+    数据库管理器
+    
+    支持上下文管理器用法:
+        with Database() as db:
+            db.get_stats()
+    """
     
     def __init__(self, db_path: str = None):
         self.db_path = db_path or DATABASE_PATH
-        self.conn = None
+        # 每个 :memory: 连接都是一个独立的空库，内存库只用写连接一个连接
+        self._in_memory = self.db_path == ':memory:'
+        self._all_conns: List[sqlite3.Connection] = []
+        self._conns_lock = threading.Lock()
+        # 每个线程一个读连接；写操作统一走单个写连接（由锁串行化）
+        self._tls = None
+        if not self._in_memory:
+            self._tls = _ThreadConnection(self._open_connection, self._all_conns,
+                                          self._conns_lock)
+        self._writer_conn = self._open_connection()
+        self._write_lock = threading.RLock()
+        self._tx_depth = 0      # 显式事务嵌套深度
+        self._tx_owner = None   # 持有显式事务的线程ID
+        self._indexes_ready = False
         self.init_database()
     
-    def connect(self):
-        """连接数据库"""
-        if not self.conn:
-            self.conn = sqlite3.connect(self.db_path)
-            self.conn.row_factory = sqlite3.Row
-        return self.conn
+    def _open_connection(self) -> sqlite3.Connection:
+        """新建连接并完成 PRAGMA 初始化"""
+        # isolation_level=None: 由 transaction() 显式控制事务边界
+        # check_same_thread=False: 允许 close() 在主线程统一关闭各线程的连接
+        conn = sqlite3.connect(
+            self.db_path, isolation_level=None, cached_statements=256,
+            check_same_thread=False
+        )
+        conn.row_factory = sqlite3.Row
+        self._apply_pragmas(conn)
+        with self._conns_lock:
+            self._all_conns.append(conn)
+        return conn
+    
+    def connect(self) -> sqlite3.Connection:
+        """
+        获取当前线程的读连接
+        
+        当前线程持有显式事务时返回写连接，保证能读到事务内尚未提交的写入；
+        内存库没有单独的读连接，同样返回写连接。
+        """
+        if self._in_memory or self._tx_owner == threading.get_ident():
+            return self._writer_conn
+        return self._tls.conn
+    
+    @contextmanager
+    def _write(self):
+        """串行化的写连接；事务外的语句在 autocommit 模式下立即提交"""
+        with self._write_lock:
+            yield self._writer_conn
+    
+    @contextmanager
+    def _read_snapshot(self):
+        """
+        只读快照：多条查询包在一个 DEFERRED 事务里，保证结果一致
+        
+        当前线程已处于事务中（如持有显式写事务）时直接复用。
+        """
+        conn = self.connect()
+        # 内存库在写连接上读，快照事务需持有写锁，避免与其他线程的写事务交错
+        with self._write_lock if self._in_memory else nullcontext():
+            if conn.in_transaction:
+                yield conn
+                return
+            conn.execute('BEGIN')
+            try:
+                yield conn
+            finally:
+                conn.execute('COMMIT')
+    
+    def _execute_script(self, script: str):
+        """
+        在单个事务内通过 executescript 一次执行多条DDL
+        
+        executescript 会先提交挂起的事务，因此不能嵌套在 transaction() 中。
+        """
+        with self._write() as conn:
+            try:
+                conn.executescript(f'BEGIN IMMEDIATE;\n{script}\nCOMMIT;')
+            except sqlite3.Error:
+                if conn.in_transaction:
+                    conn.rollback()
+                raise
+    
+    def _apply_pragmas(self, conn: sqlite3.Connection):
+        """设置 WAL 日志模式及性能相关 PRAGMA"""
+        # 内存库不支持WAL，保留默认日志模式（MEMORY）
+        if not self._in_memory:
+            try:
+                mode = conn.execute('PRAGMA journal_mode=WAL').fetchone()[0]
+                if str(mode).lower() != 'wal':
+                    logger.warning(f"⚠️ 无法启用WAL模式，当前日志模式: {mode}")
+            except sqlite3.DatabaseError as e:
+                # 网络文件系统等环境可能不支持WAL，保留默认日志模式
+                logger.warning(f"⚠️ 启用WAL失败，使用默认日志模式: {e}")
+        
+        for pragma in SQLITE_PRAGMAS:
+            conn.execute(pragma)
     
     def close(self):
-        """关闭数据库连接"""
-        if self.conn:
-            self.conn.close()
-            self.conn = None
+        """关闭所有线程的数据库连接"""
+        with self._write_lock, self._conns_lock:
+            for conn in self._all_conns:
+                try:
+                    conn.close()
+                except sqlite3.Error as e:
+                    logger.debug(f"关闭连接失败: {e}")
+            self._all_conns.clear()
+    
+    def __enter__(self) -> 'Database':
+        return self
+    
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+    
+    @contextmanager
+    def transaction(self):
+        """
+        显式事务（BEGIN IMMEDIATE ... COMMIT）
+        
+        事务内的写方法由本上下文统一提交一次；
+        支持嵌套，只有最外层负责 COMMIT / ROLLBACK。
+        
+        用法:
+            with db.transaction():
+                for row in rows:
+                    db.insert_report(...)
+        """
+        with self._write_lock:
+            conn = self._writer_conn
+            if self._tx_depth:
+                self._tx_depth += 1
+                try:
+                    yield conn
+                finally:
+                    self._tx_depth -= 1
+                return
+            
+            conn.execute('BEGIN IMMEDIATE')
+            self._tx_depth = 1
+            self._tx_owner = threading.get_ident()
+            try:
+                yield conn
+                conn.commit()
+            except BaseException:
+                conn.rollback()
+                raise
+            finally:
+                self._tx_depth = 0
+                self._tx_owner = None
     
     def init_database(self):
-        """初始化数据库表"""
-        conn = self.connect()
-        cursor = conn.cursor()
+        """
+        初始化数据库
         
-        # 分类表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS categories (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                category_id TEXT UNIQUE NOT NULL,
-                category_name TEXT NOT NULL,
-                url TEXT NOT NULL,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # 报告列表表（新增 local_path 字段）
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS reports (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                category_id TEXT NOT NULL,
-                post_id TEXT UNIQUE NOT NULL,
-                title TEXT NOT NULL,
-                detail_url TEXT NOT NULL,
-                download_url TEXT,
-                thumbnail_url TEXT,
-                view_count INTEGER DEFAULT 0,
-                publish_date TEXT,
-                status TEXT DEFAULT 'pending',
-                local_path TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (category_id) REFERENCES categories(category_id)
-            )
-        ''')
-        
-        # 下载记录表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS downloads (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                post_id TEXT NOT NULL,
-                zip_url TEXT NOT NULL,
-                file_name TEXT,
-                file_path TEXT,
-                file_size INTEGER DEFAULT 0,
-                status TEXT DEFAULT 'pending',
-                download_attempts INTEGER DEFAULT 0,
-                error_message TEXT,
-                started_at TIMESTAMP,
-                completed_at TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (post_id) REFERENCES reports(post_id)
-            )
-        ''')
-        
-        # 解压记录表
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS extractions (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                download_id INTEGER NOT NULL,
-                extract_path TEXT NOT NULL,
-                files_count INTEGER DEFAULT 0,
-                status TEXT DEFAULT 'pending',
-                extracted_at TIMESTAMP,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (download_id) REFERENCES downloads(id)
-            )
-        ''')
-        
-        # 创建索引
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_reports_category ON reports(category_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_reports_status ON reports(status)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_downloads_status ON downloads(status)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_downloads_post_id ON downloads(post_id)')
+        已有数据的库直接建好二级索引；全新的库只建表，二级索引推迟到
+        首批数据入库后由 finalize_indexes() 一次性排序构建。
+        """
+        self.init_schema()
+        if self.connect().execute('SELECT 1 FROM reports LIMIT 1').fetchone():
+            self.finalize_indexes()
+        logger.info("✅ 数据库初始化完成")
+    
+    def init_schema(self):
+        """创建数据表（只含主键/唯一约束，不建二级索引）"""
+        self._execute_script(_SCHEMA_SQL)
         
         # 检查并添加 local_path 列（兼容旧数据库）
-        try:
-            cursor.execute('SELECT local_path FROM reports LIMIT 1')
-        except sqlite3.OperationalError:
-            logger.info("📝 添加 local_path 列...")
-            cursor.execute('ALTER TABLE reports ADD COLUMN local_path TEXT')
+        with self._write() as conn:
+            try:
+                conn.execute('SELECT local_path FROM reports LIMIT 1')
+            except sqlite3.OperationalError:
+                logger.info("📝 添加 local_path 列...")
+                conn.execute('ALTER TABLE reports ADD COLUMN local_path TEXT')
+            version = conn.execute('PRAGMA user_version').fetchone()[0]
         
-        conn.commit()
-        logger.info("✅ 数据库初始化完成")
+        # 时间戳文本 -> epoch 一次性迁移
+        if version < _EPOCH_SCHEMA_VERSION:
+            logger.info("📝 迁移时间戳为 epoch 整数...")
+            self._execute_script(_MIGRATE_EPOCH_SQL)
+        if version < _VIEW_SCHEMA_VERSION:
+            self._execute_script(_CREATE_REPORTS_VIEW_SQL)
+    
+    def finalize_indexes(self):
+        """
+        创建二级索引并更新统计信息（幂等，每个实例只执行一次）
+        
+        全新库在首个分类爬取完成后调用，之后的增量写入由SQLite维护索引。
+        索引已存在（之前的运行建过）时不再重复执行DDL，只用 PRAGMA optimize
+        让SQLite按需刷新统计信息。并发爬取时多个线程会同时调用，判断与置位都在写锁内。
+        """
+        with self._write_lock:
+            if self._indexes_ready:
+                return
+            
+            with self._write() as conn:
+                existing = conn.execute(_SQL_COUNT_INDEXES, _INDEX_NAMES).fetchone()[0]
+                if existing == len(_INDEX_NAMES):
+                    conn.execute('PRAGMA optimize')
+            if existing != len(_INDEX_NAMES):
+                # 只在刚建好索引时完整 ANALYZE 一次，让查询规划器选用新索引
+                self._execute_script(f'{_INDEX_SQL}\nANALYZE;')
+                logger.debug("📇 二级索引已创建")
+            self._indexes_ready = True
     
     # ===== 分类操作 =====
     
     def insert_category(self, category_id: str, category_name: str, url: str):
         """插入分类"""
-        conn = self.connect()
-        cursor = conn.cursor()
         try:
-            cursor.execute('''
-                INSERT OR IGNORE INTO categories (category_id, category_name, url)
-                VALUES (?, ?, ?)
-            ''', (category_id, category_name, url))
-            conn.commit()
+            with self._write() as conn:
+                conn.execute(_SQL_INSERT_CATEGORY, (category_id, category_name, url))
             return True
         except Exception as e:
             logger.error(f"❌ 插入分类失败: {e}")
             return False
     
+    def insert_categories_many(self, rows: Iterable[Tuple[str, str, str]]) -> int:
+        """
+        批量插入分类（一个事务内 executemany，已存在的分类保持不变）
+        
+        Args:
+            rows: (category_id, category_name, url) 序列
+        
+        Returns:
+            新插入的分类数
+        """
+        with self.transaction() as conn:
+            cursor = conn.executemany(_SQL_INSERT_CATEGORY, rows)
+        return cursor.rowcount
+    
     def get_all_categories(self) -> List[Dict]:
         """获取所有分类"""
         conn = self.connect()
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM categories ORDER BY category_id')
+        cursor.execute(f'SELECT {_CATEGORY_COLUMNS} FROM categories ORDER BY category_id')
         return [dict(row) for row in cursor.fetchall()]
     
+    def get_category_names(self) -> Dict[str, str]:
+        """获取 category_id -> category_name 映射"""
+        return dict(self.connect().execute(
+            'SELECT category_id, category_name FROM categories'
+        ).fetchall())
+    
     def get_category_by_id(self, category_id: str) -> Optional[Dict]:
         """根据ID获取分类"""
         conn = self.connect()
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM categories WHERE category_id = ?', (category_id,))
+        cursor.execute(f'SELECT {_CATEGORY_COLUMNS} FROM categories WHERE category_id = ?',
+                       (category_id,))
         row = cursor.fetchone()
         return dict(row) if row else None
     
@@ -166,292 +571,389 @@ class Database:
     def insert_report(self, category_id: str, post_id: str, title: str, 
                       detail_url: str, **kwargs):
         """插入报告"""
-        conn = self.connect()
-        cursor = conn.cursor()
         try:
-            cursor.execute('''
-                INSERT OR IGNORE INTO reports 
-                (category_id, post_id, title, detail_url, thumbnail_url, view_count, publish_date)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (
-                category_id, post_id, title, detail_url,
-                kwargs.get('thumbnail_url', ''),
-                kwargs.get('view_count', 0),
-                kwargs.get('publish_date', '')
-            ))
-            conn.commit()
+            with self._write() as conn:
+                conn.execute(_SQL_INSERT_REPORT, (
+                    category_id, post_id, title, detail_url,
+                    kwargs.get('thumbnail_url', ''),
+                    kwargs.get('view_count', 0),
+                    kwargs.get('publish_date', '')
+                ))
             return True
         except Exception as e:
             logger.error(f"❌ 插入报告失败: {e}")
             return False
     
+    def insert_reports_many(self, rows: Iterable[Tuple]) -> int:
+        """批量插入报告（insert_reports_bulk 的别名）"""
+        return self.insert_reports_bulk(rows)
+    
+    def insert_reports_bulk(self, rows: Iterable[Tuple],
+                            chunk: int = _BULK_INSERT_CHUNK) -> int:
+        """
+        批量插入报告（单个事务 + 多行 VALUES 语句）
+        
+        每 chunk 行拼成一条 INSERT，整批只进出 SQLite 虚拟机 len(rows)/chunk 次。
+        
+        Args:
+            rows: 7元组序列 (category_id, post_id, title, detail_url,
+                  thumbnail_url, view_count, publish_date)
+            chunk: 每条语句插入的行数
+        
+        Returns:
+            实际新插入的行数（已存在的 post_id 被忽略）
+        
+        Raises:
+            在调用方的 transaction() 内失败时重新抛出，由外层事务整体回滚，
+            避免外层提交出错前已写入的部分数据
+        """
+        rows = list(rows)
+        if not rows:
+            return 0
+        nested = self._tx_owner == threading.get_ident()
+        try:
+            with self.transaction() as conn:
+                before = conn.total_changes
+                for start in range(0, len(rows), chunk):
+                    batch = rows[start:start + chunk]
+                    params = [value for row in batch for value in row]
+                    conn.execute(_bulk_insert_report_sql(len(batch)), params)
+                return conn.total_changes - before
+        except Exception as e:
+            logger.error(f"❌ 批量插入报告失败: {e}")
+            if nested:
+                raise
+            return 0
+    
     def update_report_download_url(self, post_id: str, download_url: str):
         """更新报告的下载URL"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE reports 
-            SET download_url = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE post_id = ?
-        ''', (download_url, post_id))
-        conn.commit()
+        with self._write() as conn:
+            conn.execute(_SQL_UPDATE_REPORT_DOWNLOAD_URL, (download_url, post_id))
     
     def update_report_local_path(self, post_id: str, local_path: str):
         """更新报告的本地文件路径"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE reports 
-            SET local_path = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE post_id = ?
-        ''', (local_path, post_id))
-        conn.commit()
+        with self._write() as conn:
+            conn.execute(_SQL_UPDATE_REPORT_LOCAL_PATH, (local_path, post_id))
     
     def update_report_status(self, post_id: str, status: str):
         """更新报告状态"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE reports 
-            SET status = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE post_id = ?
-        ''', (status, post_id))
-        conn.commit()
+        with self._write() as conn:
+            conn.execute(_SQL_UPDATE_REPORT_STATUS, (status, post_id))
+    
+    def mark_report_downloaded(self, post_id: str, local_path: str):
+        """标记报告已下载：状态与本地路径在一条 UPDATE 中写入"""
+        with self._write() as conn:
+            conn.execute(_SQL_MARK_REPORT_DOWNLOADED, (local_path, post_id))
     
     def get_report_by_post_id(self, post_id: str) -> Optional[Dict]:
         """根据post_id获取报告"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute('SELECT * FROM reports WHERE post_id = ?', (post_id,))
-        row = cursor.fetchone()
+        row = self.connect().execute(_SQL_GET_REPORT_BY_POST_ID, (post_id,)).fetchone()
         return dict(row) if row else None
     
-    def get_reports_by_category(self, category_id: str, status: str = None) -> List[Dict]:
-        """获取指定分类的报告（包含分类名称）"""
+    def get_reports_by_category(self, category_id: str, status: str = None,
+                                as_dict: bool = False) -> List[sqlite3.Row]:
+        """
+        获取指定分类的报告（包含分类名称）
+        
+        返回 sqlite3.Row（支持 row['post_id'] 访问），as_dict=True 时返回dict列表
+        """
         conn = self.connect()
-        cursor = conn.cursor()
         
         if status:
-            cursor.execute('''
-                SELECT r.*, c.category_name 
+            cursor = conn.execute(f'''
+                SELECT {_REPORT_ROW_COLUMNS}
                 FROM reports r
                 LEFT JOIN categories c ON r.category_id = c.category_id
                 WHERE r.category_id = ? AND r.status = ?
                 ORDER BY r.id
             ''', (category_id, status))
         else:
-            cursor.execute('''
-                SELECT r.*, c.category_name 
+            cursor = conn.execute(f'''
+                SELECT {_REPORT_ROW_COLUMNS}
                 FROM reports r
                 LEFT JOIN categories c ON r.category_id = c.category_id
                 WHERE r.category_id = ?
                 ORDER BY r.id
             ''', (category_id,))
         
-        return [dict(row) for row in cursor.fetchall()]
+        return _fetch_rows(cursor, as_dict)
     
-    def get_pending_reports(self, limit: int = 100) -> List[Dict]:
-        """获取待处理的报告（status='pending'，需要获取download_url）"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT r.*, c.category_name 
+    def get_pending_reports(self, limit: int = 100) -> List[sqlite3.Row]:
+        """
+        获取待处理的报告（status='pending'，需要获取download_url）
+        
+        返回 sqlite3.Row（支持 row['post_id'] 访问），不再逐行复制为dict
+        """
+        return self.connect().execute(f'''
+            SELECT {_REPORT_ROW_COLUMNS}
             FROM reports r
             LEFT JOIN categories c ON r.category_id = c.category_id
             WHERE r.status = 'pending'
             ORDER BY r.id
             LIMIT ?
-        ''', (limit,))
-        return [dict(row) for row in cursor.fetchall()]
-    
-    def get_ready_reports(self, limit: int = 1000) -> List[Dict]:
-        """获取准备下载的报告（status='ready'，已有download_url）"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT r.*, c.category_name 
+        ''', (limit,)).fetchall()
+    
+    @staticmethod
+    def _reports_sql(where: str, minimal: bool) -> str:
+        """报告列表查询（按 id 排序，末尾绑定 LIMIT ?）"""
+        if minimal:
+            return f'''
+                SELECT {_REPORT_MIN_COLUMNS}
+                FROM reports r
+                WHERE {where}
+                ORDER BY r.id
+                LIMIT ?
+            '''
+        return f'''
+            SELECT {_REPORT_ROW_COLUMNS}
             FROM reports r
             LEFT JOIN categories c ON r.category_id = c.category_id
-            WHERE r.status = 'ready' AND r.download_url IS NOT NULL AND r.download_url != ''
+            WHERE {where}
             ORDER BY r.id
             LIMIT ?
-        ''', (limit,))
-        return [dict(row) for row in cursor.fetchall()]
+        '''
+    
+    def _select_reports(self, where: str, params: Tuple, limit: Optional[int],
+                        minimal: bool = False) -> List[sqlite3.Row]:
+        """一条查询取出全部结果（limit 为 None 表示不限）"""
+        sql = self._reports_sql(where, minimal)
+        return self.connect().execute(sql, (*params, -1 if limit is None else limit)).fetchall()
+    
+    def _iter_reports(self, where: str, params: Tuple, limit: Optional[int],
+                      minimal: bool = False) -> Iterator[sqlite3.Row]:
+        """
+        按 id 顺序流式读取报告（keyset 分页）
+        
+        每页一条 WHERE ... AND r.id > ? LIMIT ? 的短查询：调用方可以边读边处理，
+        内存只占一页，也不会在整个下载过程中持有读快照（否则WAL无法checkpoint）。
+        一次性需要全部结果时用 _select_reports，只需一条查询。
+        
+        Args:
+            where: 过滤条件（引用 reports 别名 r）
+            params: where 中的绑定参数
+            limit: 最多返回的行数，None 表示不限
+            minimal: 只取 _REPORT_MIN_COLUMNS，省去 categories 的 JOIN
+        """
+        sql = self._reports_sql(f'{where} AND r.id > ?', minimal)
+        last_id = 0
+        remaining = limit
+        while remaining is None or remaining > 0:
+            page_size = _ITER_PAGE_SIZE if remaining is None else min(_ITER_PAGE_SIZE, remaining)
+            rows = self.connect().execute(sql, (*params, last_id, page_size)).fetchall()
+            yield from rows
+            if len(rows) < page_size:
+                return
+            last_id = rows[-1]['id']
+            if remaining is not None:
+                remaining -= len(rows)
+    
+    def iter_ready_reports(self, limit: int = None,
+                           minimal: bool = False) -> Iterator[sqlite3.Row]:
+        """流式获取准备下载的报告（status='ready'，已有download_url）"""
+        return self._iter_reports(_WHERE_READY, (), limit, minimal)
+    
+    def iter_failed_reports(self, limit: int = None) -> Iterator[sqlite3.Row]:
+        """流式获取下载失败的报告（status='failed'）"""
+        return self._iter_reports(_WHERE_FAILED, (), limit)
+    
+    def iter_downloaded_reports(self, limit: int = None) -> Iterator[sqlite3.Row]:
+        """流式获取已下载的报告（status='downloaded'）"""
+        return self._iter_reports(_WHERE_DOWNLOADED, (), limit)
+    
+    def iter_reports_by_status(self, status: str,
+                               limit: int = None) -> Iterator[sqlite3.Row]:
+        """根据状态流式获取报告"""
+        return self._iter_reports(_WHERE_STATUS, (status,), limit)
+    
+    def get_ready_reports(self, limit: int = 1000,
+                          as_dict: bool = False) -> List[sqlite3.Row]:
+        """获取准备下载的报告（status='ready'，已有download_url）"""
+        return _fetch_rows(self._select_reports(_WHERE_READY, (), limit), as_dict)
+    
+    def get_ready_reports_minimal(self, limit: int = 1000) -> List[sqlite3.Row]:
+        """
+        获取准备下载的报告（精简列，不含 category_name）
+        
+        只返回 id/post_id/title/download_url/category_id，分类名请用 get_category_names() 解析
+        """
+        return self._select_reports(_WHERE_READY, (), limit, minimal=True)
     
-    def get_failed_reports(self, limit: int = 100) -> List[Dict]:
+    def get_failed_reports(self, limit: int = 100,
+                           as_dict: bool = False) -> List[sqlite3.Row]:
         """获取下载失败的报告（status='failed'）"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT r.*, c.category_name 
-            FROM reports r
-            LEFT JOIN categories c ON r.category_id = c.category_id
-            WHERE r.status = 'failed' AND r.download_url IS NOT NULL AND r.download_url != ''
-            ORDER BY r.id
-            LIMIT ?
-        ''', (limit,))
-        return [dict(row) for row in cursor.fetchall()]
+        return _fetch_rows(self._select_reports(_WHERE_FAILED, (), limit), as_dict)
     
-    def get_downloaded_reports(self, limit: int = 1000) -> List[Dict]:
+    def get_downloaded_reports(self, limit: int = 1000,
+                               as_dict: bool = False) -> List[sqlite3.Row]:
         """获取已下载的报告（status='downloaded'）"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT r.*, c.category_name 
-            FROM reports r
-            LEFT JOIN categories c ON r.category_id = c.category_id
-            WHERE r.status = 'downloaded'
-            ORDER BY r.id
-            LIMIT ?
-        ''', (limit,))
-        return [dict(row) for row in cursor.fetchall()]
+        return _fetch_rows(self._select_reports(_WHERE_DOWNLOADED, (), limit), as_dict)
     
-    def get_reports_by_status(self, status: str, limit: int = 1000) -> List[Dict]:
+    def get_reports_by_status(self, status: str, limit: int = 1000,
+                              as_dict: bool = False) -> List[sqlite3.Row]:
         """根据状态获取报告"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT r.*, c.category_name 
-            FROM reports r
-            LEFT JOIN categories c ON r.category_id = c.category_id
-            WHERE r.status = ?
-            ORDER BY r.id
-            LIMIT ?
-        ''', (status, limit))
-        return [dict(row) for row in cursor.fetchall()]
+        return _fetch_rows(self._select_reports(_WHERE_STATUS, (status,), limit), as_dict)
     
     # ===== 下载记录操作 =====
     
     def insert_download(self, post_id: str, zip_url: str, file_name: str = None) -> int:
         """插入下载记录"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute('''
-            INSERT INTO downloads (post_id, zip_url, file_name, started_at)
-            VALUES (?, ?, ?, CURRENT_TIMESTAMP)
-        ''', (post_id, zip_url, file_name))
-        conn.commit()
-        return cursor.lastrowid
+        with self._write() as conn:
+            cursor = conn.execute(_SQL_INSERT_DOWNLOAD, (post_id, zip_url, file_name))
+            return cursor.lastrowid
     
     def update_download_status(self, download_id: int, status: str, 
                                file_path: str = None, file_size: int = None,
                                error_message: str = None):
         """更新下载状态"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        
-        if status == 'completed':
-            cursor.execute('''
-                UPDATE downloads 
-                SET status = ?, file_path = ?, file_size = ?, 
-                    completed_at = CURRENT_TIMESTAMP
-                WHERE id = ?
-            ''', (status, file_path, file_size, download_id))
-        elif status == 'failed':
-            cursor.execute('''
-                UPDATE downloads 
-                SET status = ?, error_message = ?,
-                    download_attempts = download_attempts + 1
-                WHERE id = ?
-            ''', (status, error_message, download_id))
-        else:
-            cursor.execute('''
-                UPDATE downloads 
-                SET status = ?
-                WHERE id = ?
-            ''', (status, download_id))
-        
-        conn.commit()
+        with self._write() as conn:
+            if status == 'completed':
+                conn.execute(_SQL_UPDATE_DOWNLOAD_COMPLETED,
+                             (status, file_path, file_size, download_id))
+            elif status == 'failed':
+                conn.execute(_SQL_UPDATE_DOWNLOAD_FAILED,
+                             (status, error_message, download_id))
+            else:
+                conn.execute(_SQL_UPDATE_DOWNLOAD_STATUS, (status, download_id))
+    
+    def get_pending_downloads(self, limit: int = 100) -> List[Dict]:
+        """获取未完成的下载记录（status为pending或failed，按id先后）"""
+        cursor = self.connect().execute(f'''
+            SELECT {_DOWNLOAD_COLUMNS}
+            FROM downloads
+            WHERE status IN ('pending', 'failed')
+            ORDER BY id
+            LIMIT ?
+        ''', (limit,))
+        return [dict(row) for row in cursor.fetchall()]
     
     def get_download_by_post_id(self, post_id: str) -> Optional[Dict]:
         """获取下载记录"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute('''
-            SELECT * FROM downloads 
-            WHERE post_id = ?
-            ORDER BY id DESC
-            LIMIT 1
-        ''', (post_id,))
-        row = cursor.fetchone()
+        row = self.connect().execute(_SQL_GET_DOWNLOAD_BY_POST_ID, (post_id,)).fetchone()
         return dict(row) if row else None
     
     def is_downloaded(self, post_id: str) -> bool:
-        """检查是否已下载"""
-        download = self.get_download_by_post_id(post_id)
-        return download and download['status'] == 'completed'
+        """检查是否已下载（任一下载记录为completed即视为已下载）"""
+        return self.connect().execute(_SQL_IS_DOWNLOADED, (post_id,)).fetchone() is not None
+    
+    def get_downloaded_post_ids(self) -> Set[str]:
+        """获取所有已下载报告（status='downloaded'）的 post_id 集合"""
+        rows = self.connect().execute(
+            "SELECT post_id FROM reports WHERE status = 'downloaded'"
+        ).fetchall()
+        return {row[0] for row in rows}
     
     # ===== 批量操作 =====
     
+    def update_report_statuses(self, items: Iterable[Tuple[str, str]],
+                               chunk: int = 200) -> int:
+        """
+        批量更新多个报告的状态（各报告状态可不同）
+        
+        每 chunk 条合并成一条 UPDATE ... SET status = CASE post_id WHEN ? THEN ? ... END，
+        每条绑定 3*chunk 个参数（低于SQLite默认上限999），全部在一个事务内完成。
+        
+        Args:
+            items: (post_id, status) 序列
+            chunk: 每条语句合并的报告数
+        
+        Returns:
+            更新的行数
+        """
+        items = list(items)
+        if not items:
+            return 0
+        
+        updated = 0
+        with self.transaction() as conn:
+            for start in range(0, len(items), chunk):
+                batch = items[start:start + chunk]
+                whens = ' '.join(['WHEN ? THEN ?'] * len(batch))
+                placeholders = ','.join(['?'] * len(batch))
+                params = [value for item in batch for value in item]
+                params.extend(post_id for post_id, _ in batch)
+                cursor = conn.execute(f'''
+                    UPDATE reports 
+                    SET status = CASE post_id {whens} END,
+                        updated_at = {_NOW_EPOCH}
+                    WHERE post_id IN ({placeholders})
+                ''', params)
+                updated += cursor.rowcount
+        return updated
+    
+    def update_report_links(self, items: Iterable[Tuple[str, Optional[str], str]]) -> int:
+        """
+        批量写入获取下载链接的结果（一个事务内 executemany）
+        
+        Args:
+            items: (post_id, download_url, status) 序列，download_url 为 None 时保留原值
+        
+        Returns:
+            更新的行数
+        """
+        params = [(download_url, status, post_id) for post_id, download_url, status in items]
+        if not params:
+            return 0
+        
+        with self.transaction() as conn:
+            cursor = conn.executemany(_SQL_UPDATE_REPORT_LINK, params)
+        return cursor.rowcount
+    
     def batch_update_status(self, post_ids: List[str], status: str):
         """批量更新报告状态"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        
         placeholders = ','.join(['?' for _ in post_ids])
-        cursor.execute(f'''
-            UPDATE reports 
-            SET status = ?, updated_at = CURRENT_TIMESTAMP
-            WHERE post_id IN ({placeholders})
-        ''', [status] + post_ids)
-        
-        conn.commit()
+        with self._write() as conn:
+            cursor = conn.execute(f'''
+                UPDATE reports 
+                SET status = ?, updated_at = {_NOW_EPOCH}
+                WHERE post_id IN ({placeholders})
+            ''', [status] + post_ids)
         return cursor.rowcount
     
     def reset_failed_reports(self) -> int:
         """重置所有失败的报告为ready状态"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE reports 
-            SET status = 'ready', updated_at = CURRENT_TIMESTAMP
-            WHERE status = 'failed' AND download_url IS NOT NULL
-        ''')
-        conn.commit()
+        with self._write() as conn:
+            cursor = conn.execute(f'''
+                UPDATE reports 
+                SET status = 'ready', updated_at = {_NOW_EPOCH}
+                WHERE status = 'failed' AND download_url IS NOT NULL
+            ''')
         return cursor.rowcount
     
     # ===== 统计操作 =====
     
     def get_stats(self) -> Dict:
-        """获取统计信息"""
-        conn = self.connect()
-        cursor = conn.cursor()
-        
+        """获取统计信息（同一读快照内完成，标量计数合并为一条语句）"""
         stats = {}
         
-        # 总分类数
-        cursor.execute('SELECT COUNT(*) FROM categories')
-        stats['total_categories'] = cursor.fetchone()[0]
-        
-        # 总报告数
-        cursor.execute('SELECT COUNT(*) FROM reports')
-        stats['total_reports'] = cursor.fetchone()[0]
-        
-        # 各状态报告数
-        cursor.execute('SELECT status, COUNT(*) FROM reports GROUP BY status')
-        stats['reports_by_status'] = dict(cursor.fetchall())
-        
-        # 已下载数
-        cursor.execute('SELECT COUNT(*) FROM downloads WHERE status = "completed"')
-        stats['downloads_completed'] = cursor.fetchone()[0]
-        
-        # 下载失败数
-        cursor.execute('SELECT COUNT(*) FROM downloads WHERE status = "failed"')
-        stats['downloads_failed'] = cursor.fetchone()[0]
-        
-        # 有下载链接的报告数
-        cursor.execute('SELECT COUNT(*) FROM reports WHERE download_url IS NOT NULL AND download_url != ""')
-        stats['reports_with_url'] = cursor.fetchone()[0]
-        
-        # 各分类的报告数
-        cursor.execute('''
-            SELECT c.category_name, COUNT(r.id) as count
-            FROM categories c
-            LEFT JOIN reports r ON c.category_id = r.category_id
-            GROUP BY c.category_id
-            ORDER BY count DESC
-        ''')
-        stats['reports_by_category'] = dict(cursor.fetchall())
+        with self._read_snapshot() as conn:
+            # 分类数 / 有下载链接的报告数 / 下载完成数 / 下载失败数
+            row = conn.execute('''
+                SELECT
+                    (SELECT COUNT(*) FROM categories),
+                    (SELECT COUNT(*) FROM reports
+                     WHERE download_url IS NOT NULL AND download_url != ''),
+                    COALESCE(SUM(status = 'completed'), 0),
+                    COALESCE(SUM(status = 'failed'), 0)
+                FROM downloads
+            ''').fetchone()
+            (stats['total_categories'], stats['reports_with_url'],
+             stats['downloads_completed'], stats['downloads_failed']) = tuple(row)
+            
+            # 各状态报告数（idx_reports_status 覆盖扫描），总数由其求和得到
+            reports_by_status = dict(conn.execute(
+                'SELECT status, COUNT(*) FROM reports GROUP BY status'
+            ).fetchall())
+            stats['total_reports'] = sum(reports_by_status.values())
+            stats['reports_by_status'] = reports_by_status
+            
+            # 各分类的报告数
+            stats['reports_by_category'] = dict(conn.execute('''
+                SELECT c.category_name, COUNT(r.id) as count
+                FROM categories c
+                LEFT JOIN reports r ON c.category_id = r.category_id
+                GROUP BY c.category_id
+                ORDER BY count DESC
+            ''').fetchall())
         
         return stats
     
@@ -463,53 +965,51 @@ class Database:
         stats = {}
         
         # 分类信息
-        cursor.execute('SELECT * FROM categories WHERE category_id = ?', (category_id,))
+        cursor.execute(f'SELECT {_CATEGORY_COLUMNS} FROM categories WHERE category_id = ?',
+                       (category_id,))
         row = cursor.fetchone()
         if row:
             stats['category'] = dict(row)
         
-        # 该分类的报告数
-        cursor.execute('SELECT COUNT(*) FROM reports WHERE category_id = ?', (category_id,))
-        stats['total_reports'] = cursor.fetchone()[0]
-        
-        # 各状态报告数
+        # 各状态报告数（idx_reports_cat_status 覆盖扫描），总数由其求和得到
         cursor.execute('''
             SELECT status, COUNT(*) 
             FROM reports 
             WHERE category_id = ?
             GROUP BY status
         ''', (category_id,))
-        stats['reports_by_status'] = dict(cursor.fetchall())
+        reports_by_status = dict(cursor.fetchall())
+        stats['total_reports'] = sum(reports_by_status.values())
+        stats['reports_by_status'] = reports_by_status
         
         return stats
 
 
 if __name__ == "__main__":
-    # 测试代码
-    db = Database()
-    
-    # 插入测试数据
-    db.insert_category("34", "经济报告", "https://ipoipo.cn/tags-34.html")
-    db.insert_report("34", "26028", "测试报告", "https://ipoipo.cn/post/26028.html")
-    
-    # 更新下载URL
-    db.update_report_download_url("26028", "https://ipo.ai-tag.cn/test.zip")
-    db.update_report_status("26028", "ready")
-    
-    # 测试新方法
-    print("\n📋 Ready reports:")
-    ready = db.get_ready_reports(limit=10)
-    for r in ready:
-        print(f"  - {r['title']}: {r['status']}")
-    
-    print("\n📋 Failed reports:")
-    failed = db.get_failed_reports(limit=10)
-    for r in failed:
-        print(f"  - {r['title']}: {r['status']}")
-    
-    # 获取统计
-    print("\n📊 统计信息:")
-    stats = db.get_stats()
-    print(json.dumps(stats, indent=2, ensure_ascii=False))
+    import json
     
-    db.close()
\ No newline at end of file
+    # 测试代码
+    with Database() as db:
+        # 插入测试数据
+        db.insert_category("34", "经济报告", "https://ipoipo.cn/tags-34.html")
+        db.insert_report("34", "26028", "测试报告", "https://ipoipo.cn/post/26028.html")
+        
+        # 更新下载URL
+        db.update_report_download_url("26028", "https://ipo.ai-tag.cn/test.zip")
+        db.update_report_status("26028", "ready")
+        
+        # 测试新方法
+        print("\n📋 Ready reports:")
+        ready = db.get_ready_reports(limit=10)
+        for r in ready:
+            print(f"  - {r['title']}: {r['status']}")
+        
+        print("\n📋 Failed reports:")
+        failed = db.get_failed_reports(limit=10)
+        for r in failed:
+            print(f"  - {r['title']}: {r['status']}")
+        
+        # 获取统计
+        print("\n📊 统计信息:")
+        stats = db.get_stats()
+        print(json.dumps(stats, indent=2, ensure_ascii=False))
\ No newline at end of file
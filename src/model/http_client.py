@@ -1,16 +1,69 @@
 """
 HTTP客户端 - 支持Session保持和防盗链绕过
 """
-import time
+import os
+import shutil
 import requests
-from typing import Dict, Optional, Any
+import urllib3
+from typing import BinaryIO, Dict, Iterator, Optional, Union
 from requests.adapters import HTTPAdapter
 from urllib3.util.retry import Retry
 from src.utils.logger import get_logger
+from src.config.settings import CHUNK_SIZE, PAGE_CHUNK_SIZE, WRITE_BUFFER_SIZE, RETRY_DELAY
 
 logger = get_logger(__name__)
 
 
+class _ProgressWriter:
+    """包装文件对象：供 shutil.copyfileobj 写入，每下载约10%记录一次进度"""
+    
+    def __init__(self, f: BinaryIO, total_size: int):
+        self.f = f
+        self.total_size = total_size
+        self.downloaded = 0
+        self.log_step = max(total_size // 10, 1)
+        self.next_log = self.log_step
+    
+    def write(self, data: bytes) -> int:
+        written = self.f.write(data)
+        self.downloaded += len(data)
+        if self.total_size > 0 and self.downloaded >= self.next_log:
+            progress = (self.downloaded / self.total_size) * 100
+            logger.debug(f"   下载进度: {progress:.1f}%")
+            self.next_log += self.log_step
+        return written
+
+
+def _preallocate(f: BinaryIO, size: int):
+    """
+    按 Content-Length 预分配磁盘空间（仅支持 posix_fallocate 的平台，其余平台不做处理）
+    
+    一次分配连续的块，减少大文件边写边扩展带来的碎片和元数据更新。
+    """
+    if not hasattr(os, 'posix_fallocate'):
+        return
+    try:
+        os.posix_fallocate(f.fileno(), 0, size)
+    except OSError as e:
+        logger.debug(f"posix_fallocate 失败: {e}")
+
+
+def _drop_page_cache(f: BinaryIO):
+    """
+    写盘后让内核丢弃该文件的页缓存（仅支持 posix_fadvise 的平台，其余平台不做处理）
+    
+    DONTNEED 只能丢弃已落盘的干净页，因此先 fdatasync。
+    """
+    if not hasattr(os, 'posix_fadvise'):
+        return
+    try:
+        f.flush()
+        os.fdatasync(f.fileno())
+        os.posix_fadvise(f.fileno(), 0, 0, os.POSIX_FADV_DONTNEED)
+    except OSError as e:
+        logger.debug(f"posix_fadvise 失败: {e}")
+
+
 class HTTPClient:
     """
     HTTP客户端 - 使用Session保持cookies和连接状态
@@ -40,6 +93,18 @@ class HTTPClient:
         'Cache-Control': 'max-age=0',
     }
     
+    # 下载请求的固定头（Referer / Sec-Fetch-Site 由 _get_download_headers 按来源补上）
+    DOWNLOAD_HEADERS = {
+        'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
+        'Sec-Fetch-Dest': 'document',
+        'Sec-Fetch-Mode': 'navigate',
+        'Accept-Encoding': 'identity',  # ZIP本身已压缩，避免无意义的gzip编解码
+    }
+    
+    # 连接池：缓存的主机数 / 每个主机保持的连接数
+    POOL_CONNECTIONS = 16
+    POOL_MAXSIZE = 32
+    
     def __init__(self, use_proxy: bool = False, proxy_manager=None, 
                  proxy_url: str = None, timeout: int = 30, max_retries: int = 3):
         """
@@ -81,14 +146,22 @@ class HTTPClient:
                 self.session.proxies = proxy
                 logger.info(f"📡 使用代理: {proxy}")
         
-        # 配置重试策略
+        # 配置重试策略（429/5xx 及连接错误由 urllib3 在适配器内退避重试，
+        # 遵循服务器返回的 Retry-After）
         retry_strategy = Retry(
             total=max_retries,
-            backoff_factor=1,
+            backoff_factor=RETRY_DELAY,
             status_forcelist=[429, 500, 502, 503, 504],
-            allowed_methods=["HEAD", "GET", "OPTIONS"]
+            allowed_methods=["HEAD", "GET", "OPTIONS"],
+            respect_retry_after_header=True,
+            raise_on_status=False
+        )
+        # 加大连接池，并发下载时复用 TCP/TLS 连接而不是反复握手
+        adapter = HTTPAdapter(
+            pool_connections=self.POOL_CONNECTIONS,
+            pool_maxsize=self.POOL_MAXSIZE,
+            max_retries=retry_strategy
         )
-        adapter = HTTPAdapter(max_retries=retry_strategy)
         self.session.mount("http://", adapter)
         self.session.mount("https://", adapter)
     
@@ -103,6 +176,23 @@ class HTTPClient:
         """
         return self._request('GET', url, headers=headers, **kwargs)
     
+    def get_stream(self, url: str, chunk_size: int = PAGE_CHUNK_SIZE,
+                   decode_unicode: bool = False, **kwargs) -> Iterator[Union[bytes, str]]:
+        """
+        流式GET：边接收边逐块返回响应体，调用者无需等整个响应下载完
+        
+        Args:
+            url: 请求URL
+            chunk_size: 每块字节数
+            decode_unicode: 按响应头声明的编码解码为 str（未声明时仍返回 bytes）
+            **kwargs: 其他requests参数
+        """
+        with self._request('GET', url, stream=True, **kwargs) as response:
+            if 'charset' not in response.headers.get('Content-Type', '').lower():
+                # 不用 requests 对 text/* 默认的 ISO-8859-1，交给调用者（如 lxml 按 <meta charset>）识别
+                response.encoding = None
+            yield from response.iter_content(chunk_size, decode_unicode=decode_unicode)
+    
     def head(self, url: str, headers: Dict = None, **kwargs) -> requests.Response:
         """发送HEAD请求"""
         return self._request('HEAD', url, headers=headers, **kwargs)
@@ -114,7 +204,7 @@ class HTTPClient:
     def _request(self, method: str, url: str, headers: Dict = None, 
                  **kwargs) -> requests.Response:
         """
-        发送请求（带重试）
+        发送请求（重试由适配器的 Retry 完成，代理错误时切换节点重试一次）
         
         Args:
             method: HTTP方法
@@ -125,46 +215,86 @@ class HTTPClient:
         # 设置默认超时
         kwargs.setdefault('timeout', self.timeout)
         
-        # 合并请求头
-        request_headers = dict(self.session.headers)
-        if headers:
-            request_headers.update(headers)
+        # 额外请求头由 Session 自动与默认头合并，无需每次复制整份默认头
+        try:
+            response = self.session.request(method, url, headers=headers, **kwargs)
+        except requests.exceptions.ProxyError as e:
+            # 代理失效：Retry 不了解代理轮换，切换节点后只再试一次
+            if not self._switch_proxy():
+                logger.error(f"❌ 请求失败（代理错误）: {url} - {e}")
+                raise
+            logger.warning(f"⚠️ 代理错误，已切换节点后重试: {url}")
+            response = self.session.request(method, url, headers=headers, **kwargs)
+        except requests.exceptions.RequestException as e:
+            # 连接/读取错误已由适配器的 Retry 退避重试过
+            logger.error(f"❌ 请求失败,已重试 {self.max_retries} 次: {url} - {e}")
+            raise
         
-        last_error = None
-        for attempt in range(1, self.max_retries + 1):
-            try:
-                response = self.session.request(
-                    method, url, headers=request_headers, **kwargs
-                )
-                response.raise_for_status()
-                return response
-                
-            except requests.exceptions.HTTPError as e:
-                last_error = e
-                status_code = e.response.status_code if e.response else None
-                
-                if status_code == 403:
-                    # 403错误不重试，直接返回让调用者处理
-                    logger.warning(f"⚠️ 请求失败 (尝试 {attempt}/{self.max_retries}): "
-                                 f"403 Client Error: Forbidden for url: {url}")
-                    raise
-                
-                logger.warning(f"⚠️ 请求失败 (尝试 {attempt}/{self.max_retries}): {e}")
-                
-            except requests.exceptions.RequestException as e:
-                last_error = e
-                logger.warning(f"⚠️ 请求失败 (尝试 {attempt}/{self.max_retries}): {e}")
-            
-            # 重试前等待
-            if attempt < self.max_retries:
-                time.sleep(2 ** attempt)
+        try:
+            response.raise_for_status()
+        except requests.exceptions.HTTPError as e:
+            # 可重试的状态码（429/5xx）已由适配器的 Retry 处理，
+            # 其余（如403防盗链）重试无意义，直接交给调用者处理
+            logger.warning(f"⚠️ 请求失败: {e}")
+            raise
+        return response
+    
+    def _switch_proxy(self) -> bool:
+        """
+        标记当前代理节点失败并切换到新节点
+        
+        Returns:
+            是否成功切换
+        """
+        if not (self.use_proxy and self.proxy_manager):
+            return False
+        
+        try:
+            if self.proxy_manager.current_node:
+                self.proxy_manager.mark_node_failed(self.proxy_manager.current_node)
+            self.proxy_manager.select_random()
+            self.session.proxies = self.proxy_manager.get_local_proxy()
+            return True
+        except Exception as e:
+            logger.error(f"❌ 切换代理节点失败: {e}")
+            return False
+    
+    def probe_content_length(self, url: str, referer: str = None,
+                             timeout: int = 30) -> Optional[int]:
+        """
+        用 HEAD 请求获取远程文件大小（不下载内容）
+        
+        Args:
+            url: 文件URL
+            referer: Referer URL（防盗链关键！）
+            timeout: 超时时间
+        
+        Returns:
+            Content-Length，无法获取时返回 None
+        """
+        try:
+            response = self.session.head(
+                url,
+                headers=self._get_download_headers(referer),
+                timeout=timeout,
+                allow_redirects=True
+            )
+        except requests.exceptions.RequestException as e:
+            logger.debug(f"HEAD 探测失败: {url} - {e}")
+            return None
+        
+        if response.status_code != 200:
+            return None
+        # 防盗链拦截时可能返回HTML页面，其长度没有意义
+        if 'text/html' in response.headers.get('Content-Type', '').lower():
+            return None
         
-        # 所有重试都失败
-        logger.error(f"❌ 请求失败,已重试 {self.max_retries} 次: {url}")
-        raise last_error or requests.exceptions.RequestException(f"请求失败: {url}")
+        content_length = response.headers.get('Content-Length')
+        return int(content_length) if content_length and content_length.isdigit() else None
     
     def download_file(self, url: str, save_path: str, referer: str = None,
-                     chunk_size: int = 8192, timeout: int = 300) -> bool:
+                     chunk_size: int = CHUNK_SIZE, timeout: int = 300,
+                     skip_if_complete: bool = False, drop_cache: bool = False) -> bool:
         """
         下载文件（支持防盗链绕过）
         
@@ -174,6 +304,10 @@ class HTTPClient:
             referer: Referer URL（防盗链关键！）
             chunk_size: 分块大小
             timeout: 下载超时
+            skip_if_complete: 本地文件已存在且大小与远程一致时跳过下载
+                （直接看下载请求的 Content-Length，不另发 HEAD，也不读取响应体）
+            drop_cache: 写完后丢弃文件的页缓存（文件短期内不会再读时使用，
+                避免大文件把数据库等热数据挤出内存）
         
         Returns:
             是否下载成功
@@ -220,53 +354,65 @@ class HTTPClient:
             
             # 获取文件大小
             total_size = int(response.headers.get('Content-Length', 0))
+            if (skip_if_complete and total_size > 0 and os.path.exists(save_path)
+                    and os.path.getsize(save_path) == total_size):
+                response.close()
+                logger.info(f"⏭️ 文件已完整存在，跳过下载: {save_path}")
+                return True
+            
             if total_size > 0:
                 logger.info(f"📊 文件大小: {total_size / 1024 / 1024:.2f} MB")
             
             # 创建目录
-            import os
             os.makedirs(os.path.dirname(save_path) or '.', exist_ok=True)
             
-            # 分块下载
-            downloaded = 0
-            with open(save_path, 'wb') as f:
-                for chunk in response.iter_content(chunk_size=chunk_size):
-                    if chunk:
-                        f.write(chunk)
-                        downloaded += len(chunk)
-                        
-                        # 显示进度
-                        if total_size > 0 and downloaded % (chunk_size * 100) == 0:
-                            progress = (downloaded / total_size) * 100
-                            logger.debug(f"   下载进度: {progress:.1f}%")
+            # 先写入 .part 临时文件，字节数核对无误后再原子替换为正式文件：
+            # 进程被杀或断电时只会留下 .part，不会出现"大小完整"的残缺ZIP
+            part_path = save_path + '.part'
+            # 压缩传输时 Content-Length 是压缩后的长度，不能用来预分配和核对
+            expected_size = total_size if response.headers.get(
+                'Content-Encoding', 'identity').lower() == 'identity' else 0
+            
+            # 由 copyfileobj 以大块直接从底层连接拷贝到文件，不再逐块经过 iter_content
+            response.raw.decode_content = True
+            try:
+                with open(part_path, 'wb', buffering=WRITE_BUFFER_SIZE) as f:
+                    if expected_size > 0:
+                        _preallocate(f, expected_size)
+                    writer = _ProgressWriter(f, total_size)
+                    shutil.copyfileobj(response.raw, writer, length=chunk_size)
+                    if drop_cache:
+                        _drop_page_cache(f)
+                
+                if expected_size > 0 and writer.downloaded != expected_size:
+                    logger.error(f"❌ 下载不完整 ({writer.downloaded}/{expected_size} 字节): {url}")
+                    os.remove(part_path)
+                    return False
+                os.replace(part_path, save_path)
+            except BaseException:
+                if os.path.exists(part_path):
+                    os.remove(part_path)
+                raise
             
             logger.info(f"✅ 下载完成: {save_path}")
             return True
             
-        except requests.exceptions.RequestException as e:
+        except (requests.exceptions.RequestException, urllib3.exceptions.HTTPError) as e:
             logger.error(f"❌ 下载失败: {e}")
             return False
     
-    def _get_download_headers(self, referer: str = None) -> Dict[str, str]:
+    @staticmethod
+    def _get_download_headers(referer: str = None) -> Dict[str, str]:
         """
         获取下载请求头
         
         Args:
             referer: 来源页面URL（防盗链关键）
         """
-        headers = {
-            'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8',
-            'Sec-Fetch-Dest': 'document',
-            'Sec-Fetch-Mode': 'navigate',
-        }
-        
         if referer:
-            headers['Referer'] = referer
-            headers['Sec-Fetch-Site'] = 'cross-site'  # 跨域请求
-        else:
-            headers['Sec-Fetch-Site'] = 'none'
-        
-        return headers
+            # 跨域请求
+            return {**HTTPClient.DOWNLOAD_HEADERS, 'Referer': referer, 'Sec-Fetch-Site': 'cross-site'}
+        return {**HTTPClient.DOWNLOAD_HEADERS, 'Sec-Fetch-Site': 'none'}
     
     def get_cookies(self) -> Dict[str, str]:
         """获取当前session的cookies"""
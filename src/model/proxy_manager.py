@@ -1,17 +1,39 @@
 """
 代理管理器 - 解析Clash配置并管理代理节点
 """
+import json
 import yaml
 import time
+import asyncio
 import random
-import socket
+import requests
 from typing import List, Optional, Dict
 from dataclasses import dataclass, field
+from requests.adapters import HTTPAdapter
 from src.utils.logger import get_logger
-from src.config.settings import CLASH_CONFIG_PATH, PROXY_TEST_TIMEOUT
+from src.config.settings import (
+    CLASH_CONFIG_PATH, PROXY_TEST_TIMEOUT, PROXY_SWEEP_TIMEOUT, PROXY_PROBE_URL,
+    PROXY_LATENCY_CACHE_PATH, PROXY_LATENCY_TTL, PROXY_FAIL_COOLDOWN_MAX
+)
 
 logger = get_logger(__name__)
 
+# 优先使用 LibYAML 的C实现解析Clash配置（节点多时明显更快），不可用时回退纯Python实现
+try:
+    from yaml import CSafeLoader as YamlSafeLoader
+except ImportError:
+    from yaml import SafeLoader as YamlSafeLoader
+
+
+# 代理类型 -> 该类型特有字段的提取函数（通用的 name/server/port 在 _parse_proxy 中读取）
+_PROXY_EXTRA_FIELDS = {
+    "ss": lambda p: {'password': p.get('password', ''), 'cipher': p.get('cipher', '')},
+    "vmess": lambda p: {'uuid': p.get('uuid', ''), 'alterId': p.get('alterId', 0)},
+    "http": lambda p: {},
+    "https": lambda p: {},
+    "socks5": lambda p: {},
+}
+
 
 @dataclass
 class ProxyNode:
@@ -27,6 +49,11 @@ class ProxyNode:
     latency: float = float('inf')
     fail_count: int = 0
     last_test_time: float = 0
+    cooldown_until: float = 0  # 失败后的冷却截止时间，期间不参与选择
+    name_lower: str = field(init=False, repr=False, compare=False)  # 地区筛选用的小写名称
+    
+    def __post_init__(self):
+        self.name_lower = self.name.lower()
     
     def to_requests_proxy(self, use_local_clash: bool = True, 
                           local_port: int = 7890) -> Dict[str, str]:
@@ -87,7 +114,9 @@ class ProxyManager:
         self.local_port = local_port
         self.nodes: List[ProxyNode] = []
         self.current_node: Optional[ProxyNode] = None
+        self._probe_session: Optional[requests.Session] = None
         self.load_config()
+        self._load_latency_cache()
         
         if use_local_clash:
             logger.info(f"📡 使用本地Clash代理: http://127.0.0.1:{local_port}")
@@ -98,7 +127,7 @@ class ProxyManager:
         try:
             logger.info(f"📂 加载代理配置: {self.config_path}")
             with open(self.config_path, 'r', encoding='utf-8') as f:
-                config = yaml.safe_load(f)
+                config = yaml.load(f, Loader=YamlSafeLoader)
             
             # 解析代理节点
             proxies = config.get('proxies', [])
@@ -118,84 +147,177 @@ class ProxyManager:
             logger.error(f"❌ 加载配置失败: {e}")
             raise
     
+    def _load_latency_cache(self):
+        """
+        读取未过期的测速结果（按节点名匹配），使这些节点在有效期内跳过测试
+        
+        缓存文件损坏或条目格式不对时忽略对应条目，照常测试这些节点。
+        """
+        try:
+            with open(PROXY_LATENCY_CACHE_PATH, 'r', encoding='utf-8') as f:
+                cache = json.load(f)
+        except (OSError, ValueError):
+            return
+        if not isinstance(cache, dict):
+            return
+        
+        now = time.time()
+        restored = 0
+        for node in self.nodes:
+            entry = cache.get(node.name)
+            try:
+                latency = float(entry['latency'])
+                fail_count = int(entry['fail_count'])
+                last_test_time = float(entry['last_test_time'])
+            except (KeyError, TypeError, ValueError):
+                continue
+            if now - last_test_time < PROXY_LATENCY_TTL:
+                node.latency = latency
+                node.fail_count = fail_count
+                node.last_test_time = last_test_time
+                restored += 1
+        
+        if restored:
+            logger.info(f"📂 复用 {restored} 个节点的测速缓存")
+    
+    def _save_latency_cache(self):
+        """保存测速结果（不可用节点的 latency 为 inf，以 JSON 的 Infinity 保存）"""
+        cache = {
+            node.name: {
+                'latency': node.latency,
+                'fail_count': node.fail_count,
+                'last_test_time': node.last_test_time,
+            }
+            for node in self.nodes if node.last_test_time
+        }
+        try:
+            with open(PROXY_LATENCY_CACHE_PATH, 'w', encoding='utf-8') as f:
+                json.dump(cache, f, ensure_ascii=False)
+        except OSError as e:
+            logger.debug(f"保存测速缓存失败: {e}")
+    
     def _parse_proxy(self, proxy: Dict) -> Optional[ProxyNode]:
         """解析单个代理配置"""
         try:
             proxy_type = proxy.get('type', '').lower()
             
-            if proxy_type == "ss":
-                return ProxyNode(
-                    name=proxy['name'],
-                    server=proxy['server'],
-                    port=proxy['port'],
-                    type=proxy_type,
-                    password=proxy.get('password', ''),
-                    cipher=proxy.get('cipher', '')
-                )
-            elif proxy_type == "vmess":
-                return ProxyNode(
-                    name=proxy['name'],
-                    server=proxy['server'],
-                    port=proxy['port'],
-                    type=proxy_type,
-                    uuid=proxy.get('uuid', ''),
-                    alterId=proxy.get('alterId', 0)
-                )
-            elif proxy_type in ["http", "https", "socks5"]:
-                return ProxyNode(
-                    name=proxy['name'],
-                    server=proxy['server'],
-                    port=proxy['port'],
-                    type=proxy_type
-                )
-            else:
+            extra_fields = _PROXY_EXTRA_FIELDS.get(proxy_type)
+            if extra_fields is None:
                 logger.warning(f"⚠️ 不支持的代理类型: {proxy_type}")
                 return None
-                
+            
+            return ProxyNode(
+                name=proxy['name'],
+                server=proxy['server'],
+                port=proxy['port'],
+                type=proxy_type,
+                **extra_fields(proxy)
+            )
+            
         except Exception as e:
             logger.error(f"❌ 解析代理失败: {e}")
             return None
     
-    def test_node(self, node: ProxyNode, test_url: str = "www.google.com", 
-                  test_port: int = 80) -> float:
-        """测试单个节点延迟（TCP连接测试）"""
+    def _record_test_result(self, node: ProxyNode, latency: float) -> float:
+        """
+        记录一次节点测速结果（latency 为 inf 表示连接失败或超时）
+        
+        失败也记录测试时间：不可用的节点同样写入缓存，有效期内启动不再等它超时。
+        """
+        node.latency = latency
+        node.last_test_time = time.time()
+        if latency == float('inf'):
+            node.fail_count += 1
+        return latency
+    
+    def test_local_proxy(self, test_url: str = PROXY_PROBE_URL) -> float:
+        """
+        经本地Clash端口发送HEAD请求，测试实际下载链路的延迟
+        
+        复用同一个 Session，重复探测时不再重新建立到Clash的TCP连接。
+        注意：Clash 端口走的是 Clash 当前选中的节点，无法用来区分单个节点，
+        各节点的延迟仍由 _test_node_async 的TCP连接测试得到。
+        
+        Returns:
+            延迟（毫秒），失败返回 inf
+        """
+        if self._probe_session is None:
+            self._probe_session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=4)
+            self._probe_session.mount("http://", adapter)
+            self._probe_session.mount("https://", adapter)
+        
         try:
-            start = time.time()
-            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-            sock.settimeout(PROXY_TEST_TIMEOUT)
-            sock.connect((node.server, node.port))
-            latency = (time.time() - start) * 1000
-            sock.close()
-            
-            node.latency = latency
-            node.last_test_time = time.time()
-            logger.debug(f"✅ {node.name}: {latency:.0f}ms")
+            start = time.perf_counter()
+            self._probe_session.head(
+                test_url,
+                proxies=self.get_local_proxy(),
+                timeout=PROXY_TEST_TIMEOUT
+            )
+            latency = (time.perf_counter() - start) * 1000
+            logger.debug(f"✅ 本地代理链路: {latency:.0f}ms")
             return latency
-            
-        except socket.timeout:
-            node.latency = float('inf')
-            node.fail_count += 1
-            logger.warning(f"⏱️ {node.name}: 超时")
-            return float('inf')
-        except Exception as e:
-            node.latency = float('inf')
-            node.fail_count += 1
-            logger.debug(f"❌ {node.name}: {e}")
+        except requests.exceptions.RequestException as e:
+            logger.warning(f"⚠️ 本地代理链路不可用: {e}")
             return float('inf')
     
-    def test_all_nodes(self, max_workers: int = 10):
-        """测试所有节点延迟"""
-        logger.info(f"🔍 开始测试 {len(self.nodes)} 个节点...")
+    async def _test_node_async(self, node: ProxyNode,
+                               semaphore: asyncio.Semaphore) -> float:
+        """测试单个节点延迟（与节点 server:port 建立TCP连接，不发送任何数据）"""
+        async with semaphore:
+            try:
+                start = time.perf_counter()
+                _, writer = await asyncio.wait_for(
+                    asyncio.open_connection(node.server, node.port),
+                    timeout=PROXY_TEST_TIMEOUT
+                )
+                latency = (time.perf_counter() - start) * 1000
+                writer.close()
+                logger.debug(f"✅ {node.name}: {latency:.0f}ms")
+                return self._record_test_result(node, latency)
+                
+            except asyncio.TimeoutError:
+                logger.warning(f"⏱️ {node.name}: 超时")
+            except Exception as e:
+                logger.debug(f"❌ {node.name}: {e}")
+            return self._record_test_result(node, float('inf'))
+    
+    async def _test_all_async(self, nodes: List[ProxyNode], concurrency: int):
+        """在同一个事件循环内并发测试节点，超过总时限仍未完成的测试被取消"""
+        semaphore = asyncio.Semaphore(concurrency)
+        tasks = {
+            asyncio.ensure_future(self._test_node_async(node, semaphore)): node
+            for node in nodes
+        }
+        _, pending = await asyncio.wait(tasks, timeout=PROXY_SWEEP_TIMEOUT)
         
-        from concurrent.futures import ThreadPoolExecutor, as_completed
-        with ThreadPoolExecutor(max_workers=max_workers) as executor:
-            futures = {executor.submit(self.test_node, node): node for node in self.nodes}
-            
-            for future in as_completed(futures):
-                try:
-                    future.result()
-                except Exception as e:
-                    logger.error(f"测试失败: {e}")
+        for task in pending:
+            task.cancel()
+            self._record_test_result(tasks[task], float('inf'))
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            logger.warning(f"⏱️ 测速超过 {PROXY_SWEEP_TIMEOUT}s，{len(pending)} 个节点未完成，视为不可用")
+    
+    def test_all_nodes(self, max_workers: int = 64, force: bool = False):
+        """
+        测试所有节点延迟
+        
+        Args:
+            max_workers: 同时进行的连接测试数
+            force: 忽略测速缓存，重新测试全部节点
+        """
+        now = time.time()
+        if force:
+            nodes = self.nodes
+        else:
+            nodes = [n for n in self.nodes if now - n.last_test_time >= PROXY_LATENCY_TTL]
+        
+        if nodes:
+            logger.info(f"🔍 开始测试 {len(nodes)} 个节点...")
+            asyncio.run(self._test_all_async(nodes, max_workers))
+            self._save_latency_cache()
+        else:
+            logger.info(f"⏭️ {len(self.nodes)} 个节点的测速结果仍在有效期内，跳过测试")
         
         # 按延迟排序
         self.nodes.sort(key=lambda n: n.latency)
@@ -213,17 +335,20 @@ class ProxyManager:
         
         # 按地区筛选
         if region:
-            nodes = [n for n in nodes if region.lower() in n.name.lower()]
+            region_lower = region.lower()
+            nodes = [n for n in nodes if region_lower in n.name_lower]
             if not nodes:
                 logger.warning(f"⚠️ 未找到地区 '{region}' 的节点，使用所有节点")
                 nodes = self.nodes
         
-        # 过滤掉失败次数过多的节点
-        available = [n for n in nodes if n.latency < float('inf') and n.fail_count < 3]
+        # 过滤掉失败次数过多或仍在冷却中的节点
+        now = time.time()
+        available = [n for n in nodes
+                     if n.latency < float('inf') and n.fail_count < 3 and n.cooldown_until <= now]
         
         if not available:
             logger.warning("⚠️ 没有可用节点，尝试重新测试...")
-            self.test_all_nodes()
+            self.test_all_nodes(force=True)
             available = [n for n in nodes if n.latency < float('inf')]
         
         if not available:
@@ -236,14 +361,15 @@ class ProxyManager:
         return fastest
     
     def select_random(self, max_latency: float = 500) -> ProxyNode:
-        """随机选择一个低延迟节点"""
-        available = [n for n in self.nodes if n.latency < max_latency and n.fail_count < 3]
+        """随机选择一个低延迟节点（按延迟倒数加权，越快的节点越容易被选中）"""
+        available = self.get_available_nodes(max_latency)
         
         if not available:
             logger.warning("⚠️ 没有满足条件的节点，使用最快节点")
             return self.select_fastest()
         
-        node = random.choice(available)
+        weights = [1.0 / max(n.latency, 1.0) for n in available]
+        node = random.choices(available, weights=weights, k=1)[0]
         self.current_node = node
         logger.info(f"🎲 随机选择: {node.name} ({node.latency:.0f}ms)")
         return node
@@ -282,11 +408,15 @@ class ProxyManager:
     def mark_node_failed(self, node: ProxyNode):
         """标记节点失败"""
         node.fail_count += 1
-        logger.warning(f"⚠️ 节点失败: {node.name} (失败次数: {node.fail_count})")
+        cooldown = min(PROXY_FAIL_COOLDOWN_MAX, 2 ** node.fail_count)
+        node.cooldown_until = time.time() + cooldown
+        logger.warning(f"⚠️ 节点失败: {node.name} (失败次数: {node.fail_count}，冷却 {cooldown}s)")
     
     def get_available_nodes(self, max_latency: float = 500) -> List[ProxyNode]:
-        """获取所有可用节点"""
-        return [n for n in self.nodes if n.latency < max_latency and n.fail_count < 3]
+        """获取所有可用节点（排除冷却中的节点）"""
+        now = time.time()
+        return [n for n in self.nodes
+                if n.latency < max_latency and n.fail_count < 3 and n.cooldown_until <= now]
 
 
 if __name__ == "__main__":
@@ -23,24 +23,23 @@ class CategoryScraper:
         logger.info("📚 Stage 1: 爬取分类列表")
         logger.info("=" * 60)
         
-        categories = []
-        
-        for category_id, category_name in CATEGORY_NAMES.items():
-            url = CATEGORY_PAGE_URL.format(category_id)
-            
-            category_data = {
+        categories = [
+            {
                 'category_id': category_id,
                 'category_name': category_name,
-                'url': url
+                'url': CATEGORY_PAGE_URL.format(category_id)
             }
-            
-            categories.append(category_data)
-            
-            # 保存到数据库
-            self.db.insert_category(category_id, category_name, url)
-            logger.info(f"✅ {category_name} ({category_id}): {url}")
+            for category_id, category_name in CATEGORY_NAMES.items()
+        ]
+        
+        # 所有分类一条 executemany 写入，只提交一次
+        inserted = self.db.insert_categories_many(
+            (c['category_id'], c['category_name'], c['url']) for c in categories
+        )
+        for c in categories:
+            logger.debug(f"✅ {c['category_name']} ({c['category_id']}): {c['url']}")
         
-        logger.info(f"\n✅ 完成！共 {len(categories)} 个分类")
+        logger.info(f"\n✅ 完成！共 {len(categories)} 个分类（新增 {inserted} 个）")
         return categories
     
     def get_categories_from_db(self) -> List[Dict]:
@@ -56,16 +55,15 @@ if __name__ == "__main__":
     pm.test_all_nodes()
     
     client = HTTPClient(use_proxy=True, proxy_manager=pm)
-    db = Database()
-    
-    scraper = CategoryScraper(client, db)
     
-    # 爬取分类
-    categories = scraper.scrape_all_categories()
-    
-    # 显示统计
-    stats = db.get_stats()
-    print(f"\n📊 统计: {stats['total_categories']} 个分类")
+    with Database() as db:
+        scraper = CategoryScraper(client, db)
+        
+        # 爬取分类
+        categories = scraper.scrape_all_categories()
+        
+        # 显示统计
+        stats = db.get_stats()
+        print(f"\n📊 统计: {stats['total_categories']} 个分类")
     
-    client.close()
-    db.close()
\ No newline at end of file
+    client.close()
\ No newline at end of file
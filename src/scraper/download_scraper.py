@@ -8,16 +8,52 @@
 """
 import re
 import time
+import asyncio
+import threading
 from typing import Optional, Dict, Tuple
-from bs4 import BeautifulSoup
+from html import unescape
+from bs4 import BeautifulSoup, SoupStrainer
 from urllib.parse import urljoin, urlparse
 from src.utils.logger import get_logger
 from src.model.http_client import HTTPClient
 from src.model.database import Database
-from src.config.settings import DOWNLOAD_URL
+from src.model.async_http_client import AsyncHTTPClient, RateLimiter
+from src.config.settings import (
+    DOWNLOAD_URL, SCRAPE_CONCURRENCY, SCRAPE_RATE_LIMIT, ZIP_CHUNK_SIZE
+)
 
 logger = get_logger(__name__)
 
+# 状态更新缓冲：攒够条数或超过间隔后一次性批量写入
+STATUS_FLUSH_ROWS = 50
+STATUS_FLUSH_INTERVAL = 30.0  # 秒
+
+# 快速路径：直接在HTML文本中找第一个 href 以 .zip 结尾的 <a>（与方法1等价，不构建DOM）
+_ZIP_HREF_RE = re.compile(r'<a\s[^>]*?\bhref\s*=\s*["\']([^"\']+?\.zip)["\']', re.I)
+# 回退解析时只构建 <a> 标签
+_ANCHOR_STRAINER = SoupStrainer('a')
+
+
+class _LinkResultBuffer:
+    """获取下载链接的结果缓冲：攒够 STATUS_FLUSH_ROWS 条或超过 STATUS_FLUSH_INTERVAL 秒后一次事务写入"""
+    
+    def __init__(self, database: Database):
+        self.db = database
+        self.rows = []
+        self.last_flush = time.monotonic()
+    
+    def add(self, post_id: str, zip_url: Optional[str], status: str):
+        self.rows.append((post_id, zip_url, status))
+        if (len(self.rows) >= STATUS_FLUSH_ROWS
+                or time.monotonic() - self.last_flush >= STATUS_FLUSH_INTERVAL):
+            self.flush()
+    
+    def flush(self):
+        if self.rows:
+            self.db.update_report_links(self.rows)
+            self.rows.clear()
+        self.last_flush = time.monotonic()
+
 
 class DownloadScraper:
     """
@@ -37,6 +73,26 @@ class DownloadScraper:
     def __init__(self, http_client: HTTPClient, database: Database):
         self.client = http_client
         self.db = database
+        
+        # 同步路径的请求间隔（与异步路径共用 SCRAPE_RATE_LIMIT）
+        self.request_interval = 1.0 / SCRAPE_RATE_LIMIT if SCRAPE_RATE_LIMIT > 0 else 0.0
+        self._next_request_time = 0.0
+        self._pace_lock = threading.Lock()
+    
+    def _wait_request_slot(self):
+        """
+        等待轮到下一次网络请求（间隔从上一次请求开始算起）
+        
+        取代请求之间固定的 sleep：请求本身超过间隔时不再额外等待。
+        """
+        if self.request_interval <= 0:
+            return
+        with self._pace_lock:
+            now = time.monotonic()
+            if self._next_request_time > now:
+                time.sleep(self._next_request_time - now)
+                now = self._next_request_time
+            self._next_request_time = now + self.request_interval
     
     def get_download_page_url(self, post_id: str) -> str:
         """Stage 3: 将post URL转换为download URL"""
@@ -46,10 +102,17 @@ class DownloadScraper:
         """
         从HTML中提取ZIP下载链接
         
-        支持多种匹配方式以提高成功率
+        支持多种匹配方式以提高成功率；常见页面由正则快速路径命中，
+        未命中时才用 BeautifulSoup（只解析 <a> 标签）
         """
         try:
-            soup = BeautifulSoup(html, 'lxml')
+            match = _ZIP_HREF_RE.search(html)
+            if match:
+                url = unescape(match.group(1))
+                logger.debug(f"✅ 找到ZIP链接 (快速路径): {url}")
+                return urljoin(base_url, url) if base_url else url
+            
+            soup = BeautifulSoup(html, 'lxml', parse_only=_ANCHOR_STRAINER)
             
             # 方法1: 查找href包含.zip的链接
             zip_links = soup.find_all('a', href=re.compile(r'\.zip$', re.I))
@@ -131,27 +194,29 @@ class DownloadScraper:
         Returns:
             (zip_url, download_page_url) - 同时返回referer用于后续下载
         """
+        zip_url, download_page_url = self._find_zip_url(post_id)
+        if zip_url:
+            self.db.update_report_download_url(post_id, zip_url)
+        return zip_url, download_page_url
+    
+    def _find_zip_url(self, post_id: str) -> Tuple[Optional[str], Optional[str]]:
+        """访问下载页并提取ZIP链接（不写数据库）"""
         try:
             # 获取下载页URL
             download_page_url = self.get_download_page_url(post_id)
             
             # 访问下载页面（建立session，获取cookies）
+            self._wait_request_slot()
             success, html = self.visit_download_page(download_page_url)
             if not success or not html:
                 return None, None
             
-            # 模拟人类行为：短暂延迟
-            time.sleep(0.5)
-            
             # 提取ZIP链接
             zip_url = self.extract_zip_url(html, base_url=download_page_url)
             
             if zip_url:
                 logger.info(f"✅ 找到ZIP链接: {zip_url}")
                 
-                # 更新数据库
-                self.db.update_report_download_url(post_id, zip_url)
-                
                 # 返回zip_url和referer（下载页面URL）
                 return zip_url, download_page_url
             else:
@@ -184,7 +249,10 @@ class DownloadScraper:
             url=zip_url,
             save_path=save_path,
             referer=referer_url,  # 关键：Referer必须是ipoipo.cn域名
-            timeout=300
+            chunk_size=ZIP_CHUNK_SIZE,
+            timeout=300,
+            skip_if_complete=True,
+            drop_cache=True
         )
     
     def process_report(self, post_id: str, download_file: bool = False, 
@@ -208,9 +276,7 @@ class DownloadScraper:
         
         # 如果需要下载文件
         if download_file and save_path:
-            # 短暂延迟，模拟人类行为
-            time.sleep(1)
-            
+            self._wait_request_slot()
             success = self.download_zip_file(zip_url, download_page_url, save_path)
             
             if not success:
@@ -230,25 +296,90 @@ class DownloadScraper:
         success_count = 0
         fail_count = 0
         
-        for i, report in enumerate(reports, 1):
-            post_id = report['post_id']
-            title = report['title']
-            
-            logger.info(f"\n[{i}/{len(reports)}] {title}")
-            
-            zip_url, _ = self.get_zip_download_url(post_id)
-            
-            if zip_url:
-                success_count += 1
-                self.db.update_report_status(post_id, 'ready')
-            else:
-                fail_count += 1
-                self.db.update_report_status(post_id, 'failed')
+        # 链接与状态先缓冲，按批在一个事务内写入（异常退出时也会在 finally 中落库）
+        results = _LinkResultBuffer(self.db)
+        
+        try:
+            for i, report in enumerate(reports, 1):
+                post_id = report['post_id']
+                title = report['title']
+                
+                logger.info(f"\n[{i}/{len(reports)}] {title}")
+                
+                zip_url, _ = self._find_zip_url(post_id)
+                
+                if zip_url:
+                    success_count += 1
+                    results.add(post_id, zip_url, 'ready')
+                else:
+                    fail_count += 1
+                    results.add(post_id, None, 'failed')
+        finally:
+            results.flush()
+        
+        self._print_summary(success_count, fail_count)
+    
+    async def process_all_pending_reports_async(self, limit: int = 100,
+                                                concurrency: int = SCRAPE_CONCURRENCY,
+                                                rate: float = SCRAPE_RATE_LIMIT):
+        """
+        并发处理所有待获取下载链接的报告（aiohttp）
+        
+        请求间隔由共享的 RateLimiter 控制，多个页面的网络往返可以重叠，
+        不再逐个 sleep。只获取下载链接，不建立同步 Session 的 cookies——
+        Stage 4 下载前会重新访问下载页。
+        
+        Args:
+            limit: 最多处理的报告数
+            concurrency: 同时进行的请求数
+            rate: 每秒最多发起的请求数
+        """
+        logger.info("=" * 60)
+        logger.info(f"🔗 Stage 3 & 4: 并发获取下载链接（并发 {concurrency}，{rate}/s）")
+        logger.info("=" * 60)
+        
+        reports = self.db.get_pending_reports(limit=limit)
+        total = len(reports)
+        logger.info(f"📊 待处理报告: {total} 个")
+        if not reports:
+            return
+        
+        client = AsyncHTTPClient.from_http_client(self.client)
+        limiter = RateLimiter(rate)
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        success_count = 0
+        fail_count = 0
+        results = _LinkResultBuffer(self.db)
+        
+        async with client.create_session() as session:
+            async def fetch_page(report):
+                download_page_url = self.get_download_page_url(report['post_id'])
+                async with semaphore:
+                    html = await client.fetch_text(session, download_page_url, limiter)
+                return report, download_page_url, html
             
-            # 请求间隔，避免过快
-            if i < len(reports):
-                time.sleep(2)
+            try:
+                tasks = [fetch_page(report) for report in reports]
+                for i, future in enumerate(asyncio.as_completed(tasks), 1):
+                    report, download_page_url, html = await future
+                    post_id = report['post_id']
+                    logger.info(f"[{i}/{total}] {report['title']}")
+                    
+                    zip_url = self.extract_zip_url(html, base_url=download_page_url) if html else None
+                    if zip_url:
+                        success_count += 1
+                        results.add(post_id, zip_url, 'ready')
+                    else:
+                        fail_count += 1
+                        results.add(post_id, None, 'failed')
+            finally:
+                results.flush()
         
+        self._print_summary(success_count, fail_count)
+    
+    def _print_summary(self, success_count: int, fail_count: int):
+        """打印 Stage 3 处理结果"""
         logger.info(f"\n{'=' * 60}")
         logger.info(f"✅ 处理完成！")
         logger.info(f"  - 成功: {success_count}")
@@ -2,16 +2,58 @@
 列表爬虫 - Stage 2: 爬取每个分类下的报告列表
 """
 import re
-from typing import List, Dict, Optional
-from bs4 import BeautifulSoup
+import asyncio
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, Iterable, Iterator, List, Optional, Union
+from lxml import etree
 from src.utils.logger import get_logger
 from src.model.http_client import HTTPClient
 from src.model.database import Database
-from src.config.settings import CATEGORY_PAGE_URL, CATEGORY_PAGE_PAGINATED
+from src.model.async_http_client import AsyncHTTPClient, RateLimiter
+from src.config.settings import (
+    CATEGORY_PAGE_URL, CATEGORY_PAGE_PAGINATED, LIST_CATEGORY_WORKERS, LIST_PREFETCH_PAGES,
+    PAGE_CHUNK_SIZE, SCRAPE_RATE_LIMIT
+)
 
 logger = get_logger(__name__)
 
 
+def _has_class(name: str) -> str:
+    """XPath 谓词：class 属性中含有 name 这个类（与 BeautifulSoup 的 class_ 匹配一致）"""
+    return f"contains(concat(' ', normalize-space(@class), ' '), ' {name} ')"
+
+
+# 预编译的 XPath（lxml 直接在C层求值，不构建 BeautifulSoup 的Python对象树）
+_TITLE_XPATH = etree.XPath(f".//h2[{_has_class('multi-ellipsis')}]")
+_LINK_XPATH = etree.XPath(".//a")
+_IMG_XPATH = etree.XPath(f".//img[{_has_class('img-cover')}]")
+_DESC_XPATH = etree.XPath(f".//p[{_has_class('text')}]")
+_COUNT_XPATH = etree.XPath(f".//div[{_has_class('count')}]")
+_VIEW_XPATH = etree.XPath(f".//span[{_has_class('view-num')}]")
+_EDIT_XPATH = etree.XPath(f".//span[{_has_class('edit')}]")
+
+# 详情页URL中的 post_id，例如 https://ipoipo.cn/post/26028.html -> 26028
+_POST_ID_RE = re.compile(r'/post/(\d+)\.html')
+# 浏览量文本中的第一个数字
+_DIGITS_RE = re.compile(r'\d+')
+
+
+def _first(elements: list):
+    """XPath 结果的第一个元素（没有则为 None）"""
+    return elements[0] if elements else None
+
+
+def _text(element) -> str:
+    """元素的文本，等价于 BeautifulSoup 的 get_text(strip=True)"""
+    return ''.join(s.strip() for s in element.itertext())
+
+
+def _is_card(element) -> bool:
+    """是否为报告卡片 div.wapost.card"""
+    classes = (element.get('class') or '').split()
+    return 'wapost' in classes and 'card' in classes
+
+
 class ListScraper:
     """列表页爬虫"""
     
@@ -20,15 +62,15 @@ class ListScraper:
         self.db = database
     
     def parse_report_card(self, card_element) -> Optional[Dict]:
-        """解析单个报告卡片"""
+        """解析单个报告卡片（lxml 元素）"""
         try:
             # 提取标题和链接
-            h2 = card_element.find('h2', class_='multi-ellipsis')
-            if not h2:
+            h2 = _first(_TITLE_XPATH(card_element))
+            if h2 is None:
                 return None
             
-            link = h2.find('a')
-            if not link:
+            link = _first(_LINK_XPATH(h2))
+            if link is None:
                 return None
             
             title = link.get('title', '').strip()
@@ -36,35 +78,35 @@ class ListScraper:
             
             # 提取post_id（从URL中）
             # 例如: https://ipoipo.cn/post/26028.html -> 26028
-            match = re.search(r'/post/(\d+)\.html', detail_url)
+            match = _POST_ID_RE.search(detail_url)
             if not match:
                 return None
             post_id = match.group(1)
             
             # 提取缩略图
-            img = card_element.find('img', class_='img-cover')
-            thumbnail_url = img.get('src', '') if img else ''
+            img = _first(_IMG_XPATH(card_element))
+            thumbnail_url = img.get('src', '') if img is not None else ''
             
             # 提取简介
-            text_p = card_element.find('p', class_='text')
-            description = text_p.get_text(strip=True) if text_p else ''
+            text_p = _first(_DESC_XPATH(card_element))
+            description = _text(text_p) if text_p is not None else ''
             
             # 提取浏览量和发布日期
-            count_div = card_element.find('div', class_='count')
+            count_div = _first(_COUNT_XPATH(card_element))
             view_count = 0
             publish_date = ''
             
-            if count_div:
-                view_span = count_div.find('span', class_='view-num')
-                if view_span:
-                    view_text = view_span.get_text(strip=True)
-                    match = re.search(r'\d+', view_text)
+            if count_div is not None:
+                view_span = _first(_VIEW_XPATH(count_div))
+                if view_span is not None:
+                    view_text = _text(view_span)
+                    match = _DIGITS_RE.search(view_text)
                     if match:
                         view_count = int(match.group())
                 
-                edit_span = count_div.find('span', class_='edit')
-                if edit_span:
-                    publish_date = edit_span.get_text(strip=True)
+                edit_span = _first(_EDIT_XPATH(count_div))
+                if edit_span is not None:
+                    publish_date = _text(edit_span)
             
             return {
                 'post_id': post_id,
@@ -80,27 +122,69 @@ class ListScraper:
             logger.error(f"❌ 解析报告卡片失败: {e}")
             return None
     
+    def iter_cards(self, chunks: Iterable[Union[str, bytes]]) -> Iterator[Dict]:
+        """
+        增量解析列表页：逐块喂给 HTMLPullParser，每个卡片闭合时解析并立即释放
+        
+        已处理的卡片子树会被清空并从父节点摘除，内存占用与单个卡片而非整页成正比。
+        """
+        parser = etree.HTMLPullParser(events=('end',), tag='div')
+        for chunk in chunks:
+            parser.feed(chunk)
+            yield from self._read_cards(parser)
+        parser.close()
+        yield from self._read_cards(parser)
+    
+    def _read_cards(self, parser: etree.HTMLPullParser) -> Iterator[Dict]:
+        """取出解析器中已闭合的卡片"""
+        for _, element in parser.read_events():
+            if not _is_card(element):
+                continue
+            report = self.parse_report_card(element)
+            if report:
+                yield report
+            element.clear()
+            # 摘除已处理的前序兄弟节点，避免空壳元素在父节点下累积
+            while element.getprevious() is not None:
+                del element.getparent()[0]
+    
+    def parse_page(self, html: str) -> List[Dict]:
+        """解析列表页HTML中的所有报告卡片"""
+        return list(self.iter_cards(
+            html[i:i + PAGE_CHUNK_SIZE] for i in range(0, len(html), PAGE_CHUNK_SIZE)
+        ))
+    
     def scrape_page(self, url: str) -> List[Dict]:
-        """爬取单个页面"""
+        """爬取单个页面（流式接收，收到的块立即交给解析器，网络等待与解析重叠）"""
         try:
-            response = self.client.get(url)
-            soup = BeautifulSoup(response.text, 'lxml')
-            
-            # 查找所有报告卡片
-            cards = soup.find_all('div', class_='wapost card')
-            
-            reports = []
-            for card in cards:
-                report = self.parse_report_card(card)
-                if report:
-                    reports.append(report)
-            
-            return reports
+            return list(self.iter_cards(self.client.get_stream(url, decode_unicode=True)))
             
         except Exception as e:
             logger.error(f"❌ 爬取页面失败: {url} - {e}")
             return []
     
+    @staticmethod
+    def _page_url(category_id: str, page: int) -> str:
+        """分类第 page 页的URL"""
+        if page == 1:
+            return CATEGORY_PAGE_URL.format(category_id)
+        return CATEGORY_PAGE_PAGINATED.format(category_id, page)
+    
+    def _save_reports(self, category_id: str, reports: List[Dict]):
+        """保存一页报告（整页一次事务批量写入）"""
+        self.db.insert_reports_bulk(
+            (
+                category_id,
+                report['post_id'],
+                report['title'],
+                report['detail_url'],
+                report['thumbnail_url'],
+                report['view_count'],
+                report['publish_date']
+            )
+            for report in reports
+        )
+    
     def scrape_category(self, category_id: str, category_name: str, 
                         max_pages: int = None) -> List[Dict]:
         """爬取单个分类的所有报告"""
@@ -112,12 +196,7 @@ class ListScraper:
         page = 1
         
         while True:
-            # 构造URL
-            if page == 1:
-                url = CATEGORY_PAGE_URL.format(category_id)
-            else:
-                url = CATEGORY_PAGE_PAGINATED.format(category_id, page)
-            
+            url = self._page_url(category_id, page)
             logger.info(f"📄 爬取第 {page} 页: {url}")
             
             # 爬取页面
@@ -127,17 +206,7 @@ class ListScraper:
                 logger.info(f"⚠️ 第 {page} 页没有数据，停止爬取")
                 break
             
-            # 保存到数据库
-            for report in reports:
-                self.db.insert_report(
-                    category_id=category_id,
-                    post_id=report['post_id'],
-                    title=report['title'],
-                    detail_url=report['detail_url'],
-                    thumbnail_url=report['thumbnail_url'],
-                    view_count=report['view_count'],
-                    publish_date=report['publish_date']
-                )
+            self._save_reports(category_id, reports)
             
             all_reports.extend(reports)
             logger.info(f"✅ 第 {page} 页: 获取 {len(reports)} 个报告")
@@ -149,11 +218,83 @@ class ListScraper:
             
             page += 1
         
+        # 首个分类入库后再建二级索引（已建过则为空操作）
+        self.db.finalize_indexes()
+        
         logger.info(f"\n✅ 完成！{category_name} 共 {len(all_reports)} 个报告")
         return all_reports
     
-    def scrape_all_categories(self, max_pages_per_category: int = None):
-        """爬取所有分类"""
+    async def scrape_category_async(self, category_id: str, category_name: str,
+                                    max_pages: int = None,
+                                    window: int = LIST_PREFETCH_PAGES,
+                                    rate: float = None) -> List[Dict]:
+        """
+        并发爬取单个分类（aiohttp）：每批同时请求 window 页，按页序解析入库
+        
+        遇到空页（或请求失败）即停止，同批中其后的页丢弃，结果与 scrape_category 一致。
+        rate 为每秒最多发起的请求数，默认 SCRAPE_RATE_LIMIT。
+        """
+        logger.info(f"\n{'=' * 60}")
+        logger.info(f"📑 并发爬取分类: {category_name} ({category_id})")
+        logger.info(f"{'=' * 60}")
+        
+        client = AsyncHTTPClient.from_http_client(self.client)
+        limiter = RateLimiter(SCRAPE_RATE_LIMIT if rate is None else rate)
+        
+        all_reports = []
+        page = 1
+        finished = False
+        
+        async with client.create_session() as session:
+            while not finished:
+                last_page = page + window - 1
+                if max_pages:
+                    last_page = min(last_page, max_pages)
+                pages = range(page, last_page + 1)
+                
+                htmls = await asyncio.gather(*(
+                    client.fetch_text(session, self._page_url(category_id, p), limiter)
+                    for p in pages
+                ))
+                
+                for p, html in zip(pages, htmls):
+                    reports = self.parse_page(html) if html else []
+                    if not reports:
+                        logger.info(f"⚠️ 第 {p} 页没有数据，停止爬取")
+                        finished = True
+                        break
+                    
+                    self._save_reports(category_id, reports)
+                    all_reports.extend(reports)
+                    logger.info(f"✅ 第 {p} 页: 获取 {len(reports)} 个报告")
+                
+                if not finished and max_pages and last_page >= max_pages:
+                    logger.info(f"⚠️ 达到最大页数限制: {max_pages}")
+                    finished = True
+                page = last_page + 1
+        
+        self.db.finalize_indexes()
+        
+        logger.info(f"\n✅ 完成！{category_name} 共 {len(all_reports)} 个报告")
+        return all_reports
+    
+    def scrape_category_concurrent(self, category_id: str, category_name: str,
+                                   max_pages: int = None,
+                                   rate: float = None) -> List[Dict]:
+        """在同步代码中调用 scrape_category_async（内部创建事件循环）"""
+        return asyncio.run(self.scrape_category_async(category_id, category_name, max_pages,
+                                                      rate=rate))
+    
+    def scrape_all_categories(self, max_pages_per_category: int = None,
+                              concurrent: bool = False,
+                              max_workers: int = LIST_CATEGORY_WORKERS):
+        """
+        爬取所有分类
+        
+        concurrent=True 时各分类分发到线程池（max_workers 个线程）同时爬取，
+        每个分类内部再按批并发请求多页；分类之间互不依赖，数据库写入由 Database 的写锁串行化。
+        各线程的限速器平分 SCRAPE_RATE_LIMIT，对站点的总请求速率不随线程数增加。
+        """
         logger.info("=" * 60)
         logger.info("📚 Stage 2: 爬取所有分类的报告列表")
         logger.info("=" * 60)
@@ -162,20 +303,41 @@ class ListScraper:
         categories = self.db.get_all_categories()
         
         total_reports = 0
-        for i, category in enumerate(categories, 1):
-            logger.info(f"\n进度: {i}/{len(categories)}")
-            reports = self.scrape_category(
-                category['category_id'],
-                category['category_name'],
-                max_pages=max_pages_per_category
-            )
-            total_reports += len(reports)
+        if concurrent and max_workers > 1:
+            rate = SCRAPE_RATE_LIMIT / max_workers
+            with ThreadPoolExecutor(max_workers=max_workers,
+                                    thread_name_prefix="list") as executor:
+                futures = {
+                    executor.submit(
+                        self.scrape_category_concurrent,
+                        category['category_id'],
+                        category['category_name'],
+                        max_pages_per_category,
+                        rate
+                    ): category
+                    for category in categories
+                }
+                for i, future in enumerate(as_completed(futures), 1):
+                    category = futures[future]
+                    try:
+                        total_reports += len(future.result())
+                    except Exception as e:
+                        logger.error(f"❌ 分类 {category['category_name']} 爬取失败: {e}")
+                    logger.info(f"\n进度: {i}/{len(categories)}")
+        else:
+            for i, category in enumerate(categories, 1):
+                logger.info(f"\n进度: {i}/{len(categories)}")
+                reports = self.scrape_category(
+                    category['category_id'],
+                    category['category_name'],
+                    max_pages=max_pages_per_category
+                )
+                total_reports += len(reports)
         
         logger.info(f"\n{'=' * 60}")
         logger.info(f"✅ 全部完成！共爬取 {total_reports} 个报告")
         logger.info(f"{'=' * 60}")
 
-
 if __name__ == "__main__":
     from src.model.proxy_manager import ProxyManager
     
@@ -184,25 +346,24 @@ if __name__ == "__main__":
     pm.test_all_nodes()
     
     client = HTTPClient(use_proxy=True, proxy_manager=pm)
-    db = Database()
-    
-    scraper = ListScraper(client, db)
-    
-    # 测试：只爬取第一个分类的前2页
-    categories = db.get_all_categories()
-    if categories:
-        test_category = categories[0]
-        scraper.scrape_category(
-            test_category['category_id'],
-            test_category['category_name'],
-            max_pages=2
-        )
     
-    # 显示统计
-    stats = db.get_stats()
-    print(f"\n📊 统计:")
-    print(f"  - 分类数: {stats['total_categories']}")
-    print(f"  - 报告数: {stats['total_reports']}")
+    with Database() as db:
+        scraper = ListScraper(client, db)
+        
+        # 测试：只爬取第一个分类的前2页
+        categories = db.get_all_categories()
+        if categories:
+            test_category = categories[0]
+            scraper.scrape_category(
+                test_category['category_id'],
+                test_category['category_name'],
+                max_pages=2
+            )
+        
+        # 显示统计
+        stats = db.get_stats()
+        print(f"\n📊 统计:")
+        print(f"  - 分类数: {stats['total_categories']}")
+        print(f"  - 报告数: {stats['total_reports']}")
     
-    client.close()
-    db.close()
\ No newline at end of file
+    client.close()
\ No newline at end of file
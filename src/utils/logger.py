@@ -3,7 +3,7 @@
 """
 import sys
 from loguru import logger
-from config.settings import LOG_DIR, LOG_LEVEL, LOG_ROTATION, LOG_RETENTION
+from src.config.settings import LOG_DIR, LOG_LEVEL, LOG_ROTATION, LOG_RETENTION
 
 # 移除默认的handler
 logger.remove()
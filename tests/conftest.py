@@ -0,0 +1,27 @@
+"""
+Shared pytest fixtures.
+"""
+import os
+import sys
+
+import pytest
+
+# Add project root to path to import modules
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from src.model.database import Database
+
+
+def report_row(post_id, category_id='c1', title=None):
+    """Build the 7-tuple accepted by Database.insert_reports_bulk."""
+    return (category_id, str(post_id), title or f'report {post_id}',
+            f'https://ipoipo.cn/post/{post_id}.html', '', 0, '2025-01-01')
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A fresh on-disk database with one category."""
+    database = Database(str(tmp_path / 'test.db'))
+    database.insert_category('c1', 'Category 1', 'https://ipoipo.cn/tags-c1.html')
+    yield database
+    database.close()
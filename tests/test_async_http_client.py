@@ -0,0 +1,235 @@
+"""
+Tests for RateLimiter and AsyncHTTPClient against a local aiohttp server.
+"""
+import asyncio
+import time
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.model import async_http_client
+from src.model.async_http_client import (
+    RATE_LIMIT_MAX_INTERVAL, RATE_LIMIT_RECOVERY, AsyncHTTPClient, RateLimiter
+)
+
+
+@pytest.fixture(autouse=True)
+def no_retry_delay(monkeypatch):
+    monkeypatch.setattr(async_http_client, 'RETRY_DELAY', 0)
+
+
+def run_with_server(routes, scenario):
+    """Start an aiohttp server with routes, then await scenario(server, client, session)."""
+    async def main():
+        app = web.Application()
+        app.add_routes(routes)
+        client = AsyncHTTPClient(max_retries=2)
+        async with TestServer(app, host='127.0.0.1') as server:
+            async with client.create_session() as session:
+                return await scenario(server, client, session)
+    return asyncio.run(main())
+
+
+# ===== RateLimiter =====
+
+def test_rate_limiter_spaces_requests():
+    async def main():
+        limiter = RateLimiter(20)
+        start = time.monotonic()
+        await asyncio.gather(*(limiter.wait() for _ in range(5)))
+        return time.monotonic() - start
+
+    # the first request passes immediately, the other four wait 0.05 s each
+    assert asyncio.run(main()) >= 0.19
+
+
+def test_rate_limiter_without_rate_does_not_wait():
+    async def main():
+        limiter = RateLimiter(0)
+        start = time.monotonic()
+        for _ in range(100):
+            await limiter.wait()
+        return time.monotonic() - start
+
+    assert asyncio.run(main()) < 0.05
+
+
+def test_rate_limiter_slow_down_is_capped():
+    limiter = RateLimiter(2)
+    limiter.slow_down(time.monotonic())
+    assert limiter.interval == pytest.approx(1.0)
+    for _ in range(10):
+        limiter.slow_down(time.monotonic())
+    assert limiter.interval == RATE_LIMIT_MAX_INTERVAL
+
+
+def test_rate_limiter_slows_down_once_per_burst_of_429s():
+    async def main():
+        limiter = RateLimiter(100)
+        sent = await asyncio.gather(*(limiter.wait() for _ in range(5)))
+        # every in-flight request comes back 429
+        for sent_at in sent:
+            limiter.slow_down(sent_at)
+        return limiter.interval
+
+    assert asyncio.run(main()) == pytest.approx(0.02)
+
+
+def test_rate_limiter_recovers_towards_base_rate():
+    limiter = RateLimiter(100)
+    limiter.slow_down(time.monotonic())
+    limiter.recover()
+    assert limiter.interval == pytest.approx(0.02 / RATE_LIMIT_RECOVERY)
+    for _ in range(100):
+        limiter.recover()
+    assert limiter.interval == pytest.approx(0.01)
+
+
+# ===== fetch_text =====
+
+def test_fetch_text_retries_server_errors():
+    hits = []
+
+    async def flaky(request):
+        hits.append(1)
+        if len(hits) < 3:
+            return web.Response(status=503)
+        return web.Response(text='ok')
+
+    async def scenario(server, client, session):
+        return await client.fetch_text(session, str(server.make_url('/page')))
+
+    assert run_with_server([web.get('/page', flaky)], scenario) == 'ok'
+    assert len(hits) == 3
+
+
+def test_fetch_text_gives_up_after_max_retries():
+    hits = []
+
+    async def broken(request):
+        hits.append(1)
+        return web.Response(status=500)
+
+    async def scenario(server, client, session):
+        return await client.fetch_text(session, str(server.make_url('/page')))
+
+    assert run_with_server([web.get('/page', broken)], scenario) is None
+    assert len(hits) == 3  # first attempt + max_retries
+
+
+@pytest.mark.parametrize('status', [403, 404])
+def test_fetch_text_does_not_retry_client_errors(status):
+    hits = []
+
+    async def handler(request):
+        hits.append(1)
+        return web.Response(status=status)
+
+    async def scenario(server, client, session):
+        return await client.fetch_text(session, str(server.make_url('/page')))
+
+    assert run_with_server([web.get('/page', handler)], scenario) is None
+    assert len(hits) == 1
+
+
+def test_fetch_text_slows_limiter_down_on_429():
+    hits = []
+
+    async def limited(request):
+        hits.append(1)
+        if len(hits) == 1:
+            return web.Response(status=429)
+        return web.Response(text='ok')
+
+    async def scenario(server, client, session):
+        limiter = RateLimiter(100)
+        text = await client.fetch_text(session, str(server.make_url('/page')), limiter)
+        return text, limiter.interval
+
+    text, interval = run_with_server([web.get('/page', limited)], scenario)
+    assert text == 'ok'
+    # doubled by the 429, then eased back by the successful retry
+    assert interval == pytest.approx(0.02 / RATE_LIMIT_RECOVERY)
+
+
+# ===== fetch_file =====
+
+ZIP_BODY = b'PK\x03\x04' + b'x' * 4096
+
+
+async def zip_handler(request):
+    return web.Response(body=ZIP_BODY, content_type='application/zip')
+
+
+async def truncated_handler(request):
+    response = web.StreamResponse(headers={'Content-Type': 'application/zip'})
+    response.content_length = len(ZIP_BODY)
+    await response.prepare(request)
+    await response.write(ZIP_BODY[:1024])
+    # drop the connection before the declared length is sent
+    request.transport.close()
+    return response
+
+
+async def forbidden_handler(request):
+    return web.Response(status=403)
+
+
+async def html_handler(request):
+    return web.Response(text='<html>hotlink</html>', content_type='text/html')
+
+
+async def referer_handler(request):
+    return web.json_response({'referer': request.headers.get('Referer')})
+
+
+def test_fetch_file_writes_body(tmp_path):
+    save_path = tmp_path / 'sub' / 'a.zip'
+
+    async def scenario(server, client, session):
+        return await client.fetch_file(session, str(server.make_url('/a.zip')), str(save_path))
+
+    assert run_with_server([web.get('/a.zip', zip_handler)], scenario) == 200
+    assert save_path.read_bytes() == ZIP_BODY
+    assert list(save_path.parent.iterdir()) == [save_path]
+
+
+@pytest.mark.parametrize('handler', [forbidden_handler, html_handler])
+def test_fetch_file_reports_hotlink_block_as_403(tmp_path, handler):
+    save_path = tmp_path / 'a.zip'
+
+    async def scenario(server, client, session):
+        return await client.fetch_file(session, str(server.make_url('/a.zip')), str(save_path))
+
+    assert run_with_server([web.get('/a.zip', handler)], scenario) == 403
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_fetch_file_connection_error_returns_none(tmp_path):
+    async def scenario(server, client, session):
+        # nothing listens on the discard port
+        return await client.fetch_file(session, 'http://127.0.0.1:9/a.zip', str(tmp_path / 'a.zip'))
+
+    assert run_with_server([], scenario) is None
+
+
+def test_fetch_file_truncated_download_leaves_no_file(tmp_path):
+    save_path = tmp_path / 'a.zip'
+
+    async def scenario(server, client, session):
+        return await client.fetch_file(session, str(server.make_url('/a.zip')), str(save_path))
+
+    assert run_with_server([web.get('/a.zip', truncated_handler)], scenario) is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_fetch_file_sends_referer(tmp_path):
+    save_path = tmp_path / 'referer.json'
+
+    async def scenario(server, client, session):
+        return await client.fetch_file(session, str(server.make_url('/r')), str(save_path),
+                                       referer='https://ipoipo.cn/download/1.html')
+
+    assert run_with_server([web.get('/r', referer_handler)], scenario) == 200
+    assert b'https://ipoipo.cn/download/1.html' in save_path.read_bytes()
@@ -0,0 +1,291 @@
+"""
+Tests for the SQLite layer.
+"""
+import sqlite3
+import threading
+
+import pytest
+
+from src.model import database as database_module
+from src.model.database import Database
+from conftest import report_row
+
+
+def count_reports(db):
+    return db.connect().execute('SELECT COUNT(*) FROM reports').fetchone()[0]
+
+
+# ===== transaction() =====
+
+def test_transaction_commits_once_at_outermost_level(db):
+    with db.transaction():
+        db.insert_reports_bulk([report_row(1)])
+        with db.transaction():
+            db.insert_reports_bulk([report_row(2)])
+        # nested exit must not commit: still inside the outer transaction
+        assert db._writer_conn.in_transaction
+    assert not db._writer_conn.in_transaction
+    assert count_reports(db) == 2
+
+
+def test_transaction_rolls_back_everything_on_error(db):
+    with pytest.raises(RuntimeError):
+        with db.transaction():
+            db.insert_reports_bulk([report_row(1)])
+            with db.transaction():
+                db.insert_reports_bulk([report_row(2)])
+            raise RuntimeError('boom')
+    assert count_reports(db) == 0
+    assert db._tx_depth == 0 and db._tx_owner is None
+
+
+def test_reads_inside_transaction_see_uncommitted_writes(db):
+    with db.transaction():
+        db.insert_reports_bulk([report_row(1)])
+        assert db.get_report_by_post_id('1')['title'] == 'report 1'
+
+
+# ===== batch writes =====
+
+def test_insert_reports_bulk_counts_new_rows_across_chunks(db):
+    assert db.insert_reports_bulk([report_row(i) for i in range(250)], chunk=100) == 250
+    # duplicates are ignored and not counted
+    assert db.insert_reports_bulk([report_row(0), report_row(250)]) == 1
+    assert count_reports(db) == 251
+
+
+def test_insert_reports_bulk_returns_zero_on_error_when_standalone(db):
+    bad_row = report_row(2)[:-1]
+    assert db.insert_reports_bulk([report_row(1), bad_row]) == 0
+    assert count_reports(db) == 0
+
+
+def test_insert_reports_bulk_reraises_inside_caller_transaction(db):
+    with pytest.raises(sqlite3.ProgrammingError):
+        with db.transaction():
+            db.insert_reports_bulk([report_row(1)])
+            db.insert_reports_bulk([report_row(2)[:-1]])
+    # the outer transaction is rolled back as a whole
+    assert count_reports(db) == 0
+
+
+def test_update_report_statuses_sets_per_report_status(db):
+    db.insert_reports_bulk([report_row(i) for i in range(5)])
+    updated = db.update_report_statuses(
+        [('0', 'ready'), ('1', 'failed'), ('2', 'ready'), ('missing', 'ready')], chunk=2
+    )
+    assert updated == 3
+    statuses = dict(db.connect().execute('SELECT post_id, status FROM reports').fetchall())
+    assert statuses == {'0': 'ready', '1': 'failed', '2': 'ready', '3': 'pending', '4': 'pending'}
+
+
+def test_update_report_links_keeps_existing_url_when_none(db):
+    db.insert_reports_bulk([report_row(1), report_row(2)])
+    db.update_report_download_url('2', 'https://ipoipo.cn/old.zip')
+    assert db.update_report_links([
+        ('1', 'https://ipoipo.cn/new.zip', 'ready'),
+        ('2', None, 'failed'),
+    ]) == 2
+    assert db.update_report_links([]) == 0
+
+    first = db.get_report_by_post_id('1')
+    second = db.get_report_by_post_id('2')
+    assert (first['download_url'], first['status']) == ('https://ipoipo.cn/new.zip', 'ready')
+    assert (second['download_url'], second['status']) == ('https://ipoipo.cn/old.zip', 'failed')
+
+
+# ===== keyset pagination =====
+
+@pytest.fixture
+def ready_db(db, monkeypatch):
+    """25 reports, every third without a download link; small pages to force paging."""
+    monkeypatch.setattr(database_module, '_ITER_PAGE_SIZE', 4)
+    db.insert_reports_bulk([report_row(i) for i in range(25)])
+    db.update_report_links(
+        (str(i), None if i % 3 == 0 else f'https://ipoipo.cn/{i}.zip', 'ready')
+        for i in range(25)
+    )
+    return db
+
+
+def test_iter_ready_reports_pages_through_all_rows_in_id_order(ready_db):
+    rows = list(ready_db.iter_ready_reports())
+    expected = [str(i) for i in range(25) if i % 3 != 0]
+    assert [row['post_id'] for row in rows] == expected
+    ids = [row['id'] for row in rows]
+    assert ids == sorted(ids)
+    assert rows[0]['category_name'] == 'Category 1'
+
+
+@pytest.mark.parametrize('limit', [0, 1, 4, 5, 16, 100])
+def test_iter_ready_reports_respects_limit(ready_db, limit):
+    expected = [str(i) for i in range(25) if i % 3 != 0][:limit]
+    assert [row['post_id'] for row in ready_db.iter_ready_reports(limit=limit)] == expected
+
+
+def test_iter_ready_reports_minimal_skips_category_join(ready_db):
+    row = next(ready_db.iter_ready_reports(minimal=True))
+    assert set(row.keys()) == {'id', 'post_id', 'title', 'download_url', 'category_id'}
+    assert ready_db.get_ready_reports_minimal(limit=1)[0]['post_id'] == row['post_id']
+
+
+def test_iter_reports_by_status(ready_db):
+    ready_db.update_report_statuses([('1', 'failed'), ('5', 'failed')])
+    assert [row['post_id'] for row in ready_db.iter_reports_by_status('failed')] == ['1', '5']
+
+
+def count_selects(db, call):
+    """Run call() and count the SELECT statements it sends to the current thread's reader."""
+    statements = []
+    conn = db.connect()
+    conn.set_trace_callback(statements.append)
+    try:
+        result = call()
+    finally:
+        conn.set_trace_callback(None)
+    return result, sum(sql.lstrip().startswith('SELECT') for sql in statements)
+
+
+def test_iter_ready_reports_reads_one_page_per_query(ready_db):
+    rows, selects = count_selects(ready_db, lambda: list(ready_db.iter_ready_reports()))
+    assert len(rows) == 16
+    assert selects == 5  # 4 full pages, then an empty one ends the scan
+
+
+def test_get_ready_reports_uses_a_single_query(ready_db):
+    rows, selects = count_selects(ready_db, lambda: ready_db.get_ready_reports(limit=1000))
+    assert [row['post_id'] for row in rows] == [str(i) for i in range(25) if i % 3 != 0]
+    assert selects == 1
+
+
+
+# ===== connections =====
+
+def test_memory_database_shares_one_connection():
+    with Database(':memory:') as db:
+        db.insert_category('c1', 'Category 1', 'https://ipoipo.cn/tags-c1.html')
+        db.insert_reports_bulk([report_row(1)])
+        assert db.connect() is db._writer_conn
+        assert db.get_report_by_post_id('1')['title'] == 'report 1'
+        assert db.get_stats()['total_reports'] == 1
+
+
+def test_journal_mode_is_wal_on_disk_and_memory_in_memory(db):
+    assert db.connect().execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    with Database(':memory:') as memory_db:
+        assert memory_db.connect().execute('PRAGMA journal_mode').fetchone()[0] == 'memory'
+
+
+def test_reader_connection_is_closed_when_its_thread_exits(db):
+    for _ in range(5):
+        thread = threading.Thread(target=db.get_all_categories)
+        thread.start()
+        thread.join()
+    # only the writer and the main thread's reader remain
+    assert len(db._all_conns) == 2
+
+
+# ===== epoch migration =====
+
+def _create_legacy_database(path):
+    """A database in the original layout: CURRENT_TIMESTAMP text columns, user_version 0."""
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        CREATE TABLE categories (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category_id TEXT UNIQUE NOT NULL,
+            category_name TEXT NOT NULL,
+            url TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        CREATE TABLE reports (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            category_id TEXT NOT NULL,
+            post_id TEXT UNIQUE NOT NULL,
+            title TEXT NOT NULL,
+            detail_url TEXT NOT NULL,
+            download_url TEXT,
+            thumbnail_url TEXT,
+            view_count INTEGER DEFAULT 0,
+            publish_date TEXT,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        INSERT INTO categories (category_id, category_name, url, created_at)
+            VALUES ('c1', 'Category 1', 'u', '2024-01-02 03:04:05');
+        INSERT INTO reports (category_id, post_id, title, detail_url, created_at, updated_at)
+            VALUES ('c1', '1', 't', 'u', '2024-01-02 03:04:05', '2024-01-02 03:04:06');
+    ''')
+    conn.commit()
+    conn.close()
+
+
+def test_legacy_text_timestamps_are_migrated_to_epoch(tmp_path):
+    path = str(tmp_path / 'legacy.db')
+    _create_legacy_database(path)
+
+    with Database(path) as db:
+        conn = db.connect()
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == database_module._VIEW_SCHEMA_VERSION
+        row = conn.execute(
+            'SELECT created_at, updated_at, typeof(created_at), local_path FROM reports'
+        ).fetchone()
+        assert tuple(row) == (1704164645, 1704164646, 'integer', None)
+        category_created = conn.execute('SELECT created_at FROM categories').fetchone()[0]
+        assert category_created == 1704164645
+
+
+def test_epoch_migration_runs_only_once(tmp_path, monkeypatch):
+    path = str(tmp_path / 'legacy.db')
+    _create_legacy_database(path)
+    Database(path).close()
+
+    scripts = []
+    original = Database._execute_script
+
+    def spy(self, script):
+        scripts.append(script)
+        return original(self, script)
+
+    monkeypatch.setattr(Database, '_execute_script', spy)
+    Database(path).close()
+    assert database_module._MIGRATE_EPOCH_SQL not in scripts
+    assert database_module._CREATE_REPORTS_VIEW_SQL not in scripts
+    assert not any('CREATE INDEX' in script for script in scripts)
+
+
+def test_reopening_does_not_change_the_schema(tmp_path):
+    path = str(tmp_path / 'test.db')
+    Database(path).close()
+    with Database(path) as db:
+        schema_version = db.connect().execute('PRAGMA schema_version').fetchone()[0]
+    with Database(path) as db:
+        assert db.connect().execute('PRAGMA schema_version').fetchone()[0] == schema_version
+
+
+def test_utc_view_from_version_1_is_replaced(tmp_path):
+    path = str(tmp_path / 'v1.db')
+    Database(path).close()
+    conn = sqlite3.connect(path)
+    conn.executescript('''
+        DROP VIEW reports_v;
+        CREATE VIEW reports_v AS
+        SELECT *, datetime(created_at, 'unixepoch') AS created_at_iso FROM reports;
+        PRAGMA user_version = 1;
+    ''')
+    conn.close()
+
+    with Database(path) as db:
+        sql = db.connect().execute(
+            "SELECT sql FROM sqlite_master WHERE name = 'reports_v'"
+        ).fetchone()[0]
+    assert "'localtime'" in sql
+
+
+def test_reports_view_formats_epoch(db):
+    db.insert_reports_bulk([report_row(1)])
+    row = db.connect().execute(
+        "SELECT created_at_iso, datetime(created_at, 'unixepoch', 'localtime') FROM reports_v"
+    ).fetchone()
+    assert row[0] == row[1]
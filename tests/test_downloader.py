@@ -0,0 +1,147 @@
+"""
+Tests for the concurrent (aiohttp) download path of Downloader.
+"""
+import asyncio
+from pathlib import Path
+
+import pytest
+from aiohttp import web
+from aiohttp.test_utils import TestServer
+
+from src.downloader import downloader as downloader_module
+from src.downloader.downloader import Downloader
+from src.downloader.file_manager import FileManager
+from src.model.http_client import HTTPClient
+from conftest import report_row
+
+ZIP_BODY = b'PK\x03\x04' + b'x' * 4096
+
+
+class HotlinkSite:
+    """
+    Local stand-in for ipoipo.cn: the download page sets a session cookie,
+    and ZIPs are served only with that cookie and a download-page Referer.
+    """
+
+    def __init__(self, blocked_once=(), always_blocked=()):
+        self.blocked_once = set(blocked_once)
+        self.always_blocked = set(always_blocked)
+        self.page_hits = []
+        self.zip_hits = []
+
+    async def download_page(self, request):
+        post_id = request.match_info['post_id']
+        self.page_hits.append(post_id)
+        response = web.Response(text='<html>download</html>', content_type='text/html')
+        response.set_cookie('sid', 'session')
+        return response
+
+    async def zip_file(self, request):
+        name = request.match_info['name']
+        self.zip_hits.append(name)
+        if request.cookies.get('sid') != 'session':
+            return web.Response(status=403)
+        if '/download/' not in request.headers.get('Referer', ''):
+            return web.Response(status=403)
+        if name in self.always_blocked:
+            return web.Response(status=403)
+        if name in self.blocked_once:
+            self.blocked_once.discard(name)
+            return web.Response(status=403)
+        return web.Response(body=ZIP_BODY, content_type='application/zip')
+
+    def routes(self):
+        return [
+            web.get('/download/{post_id}.html', self.download_page),
+            web.get('/files/{name}.zip', self.zip_file),
+        ]
+
+
+@pytest.fixture
+def switches(monkeypatch):
+    """Record proxy switches and skip the post-switch pause."""
+    monkeypatch.setattr(downloader_module.time, 'sleep', lambda seconds: None)
+    return []
+
+
+def run_concurrent(site, db, tmp_path, switches, post_ids, max_workers=3):
+    """Serve site locally, point Downloader at it and run the concurrent path."""
+    async def main():
+        app = web.Application()
+        app.add_routes(site.routes())
+        # cookies are not stored for bare IP hosts, so serve on localhost
+        async with TestServer(app, host='localhost') as server:
+            base = str(server.make_url('/'))
+            downloader_module.DOWNLOAD_URL = base + 'download/{}.html'
+            db.update_report_links(
+                (post_id, f'{base}files/{post_id}.zip', 'ready') for post_id in post_ids
+            )
+            downloader = Downloader(
+                HTTPClient(), db, FileManager(str(tmp_path / 'downloads')),
+                auto_extract=False, request_interval=0,
+                proxy_switch_callback=lambda: switches.append(1) or True,
+            )
+            reports = list(db.iter_ready_reports())
+            return await downloader._download_concurrent_async(reports, max_workers=max_workers)
+
+    original_url = downloader_module.DOWNLOAD_URL
+    try:
+        return asyncio.run(main())
+    finally:
+        downloader_module.DOWNLOAD_URL = original_url
+
+
+def statuses(db):
+    return dict(db.connect().execute('SELECT post_id, status FROM reports').fetchall())
+
+
+def test_concurrent_download_marks_reports_downloaded(db, tmp_path, switches):
+    post_ids = [str(i) for i in range(6)]
+    db.insert_reports_bulk([report_row(i) for i in post_ids])
+    site = HotlinkSite()
+
+    stats = run_concurrent(site, db, tmp_path, switches, post_ids)
+
+    assert stats == {'success': 6, 'failed': 0, 'skipped': 0}
+    assert sorted(site.page_hits) == post_ids
+    assert switches == []
+    for post_id in post_ids:
+        report = db.get_report_by_post_id(post_id)
+        assert report['status'] == 'downloaded'
+        assert Path(report['local_path']).read_bytes() == ZIP_BODY
+
+
+def test_concurrent_download_switches_proxy_and_retries_on_403(db, tmp_path, switches):
+    db.insert_reports_bulk([report_row(1), report_row(2)])
+    site = HotlinkSite(blocked_once={'1'})
+
+    stats = run_concurrent(site, db, tmp_path, switches, ['1', '2'])
+
+    assert stats == {'success': 2, 'failed': 0, 'skipped': 0}
+    assert len(switches) == 1
+    assert site.zip_hits.count('1') == 2
+    assert statuses(db) == {'1': 'downloaded', '2': 'downloaded'}
+
+
+def test_concurrent_download_marks_failed_after_max_attempts(db, tmp_path, switches):
+    db.insert_reports_bulk([report_row(1), report_row(2)])
+    site = HotlinkSite(always_blocked={'1'})
+
+    stats = run_concurrent(site, db, tmp_path, switches, ['1', '2'])
+
+    assert stats == {'success': 1, 'failed': 1, 'skipped': 0}
+    assert site.zip_hits.count('1') == 3
+    assert statuses(db) == {'1': 'failed', '2': 'downloaded'}
+
+
+def test_concurrent_download_skips_existing_downloaded_files(db, tmp_path, switches):
+    db.insert_reports_bulk([report_row(1)])
+    site = HotlinkSite()
+    run_concurrent(site, db, tmp_path, switches, ['1'])
+
+    site.page_hits.clear()
+    db.update_report_status('1', 'ready')
+    stats = run_concurrent(site, db, tmp_path, switches, ['1'])
+
+    assert stats == {'success': 1, 'failed': 0, 'skipped': 0}
+    assert site.page_hits == []
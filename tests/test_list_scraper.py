@@ -0,0 +1,106 @@
+"""
+Tests for ListScraper's incremental (HTMLPullParser) list-page parsing.
+"""
+import pytest
+
+from src.scraper.list_scraper import ListScraper
+
+CARD = '''
+<div class="wapost card">
+  <a href="/post/{i}.html"><img class="img-cover lazy" src="https://img.ipoipo.cn/{i}.jpg"></a>
+  <h2 class="multi-ellipsis title"><a href="https://ipoipo.cn/post/{i}.html" title=" 报告 {i} ">报告 {i}</a></h2>
+  <p class="text"> 简介 <b>加粗</b> 文本 {i} </p>
+  <div class="count"><span class="view-num"><i></i> 1,2{i}次浏览</span><span class="edit"> 2025-04-0{i} </span></div>
+</div>'''
+
+# cards that must be skipped: title link without a post id, and no title at all
+INVALID_CARDS = (
+    '<div class="wapost card"><h2 class="multi-ellipsis"><a href="/other">x</a></h2></div>'
+    '<div class="wapost card"><p>no title</p></div>'
+)
+
+
+def build_page(count=5, extra=''):
+    cards = ''.join(CARD.format(i=i) for i in range(1, count + 1))
+    return ('<html><head><meta charset="utf-8"></head><body><div class="list">'
+            + cards + extra + '</div></body></html>')
+
+
+@pytest.fixture
+def scraper():
+    return ListScraper(http_client=None, database=None)
+
+
+def test_parse_page_extracts_card_fields(scraper):
+    reports = scraper.parse_page(build_page(count=2))
+    assert reports[0] == {
+        'post_id': '1',
+        'title': '报告 1',
+        'detail_url': 'https://ipoipo.cn/post/1.html',
+        'thumbnail_url': 'https://img.ipoipo.cn/1.jpg',
+        'description': '简介加粗文本 1',
+        'view_count': 1,
+        'publish_date': '2025-04-01',
+    }
+    assert [r['post_id'] for r in reports] == ['1', '2']
+
+
+def test_parse_page_skips_invalid_cards(scraper):
+    reports = scraper.parse_page(build_page(count=3, extra=INVALID_CARDS))
+    assert [r['post_id'] for r in reports] == ['1', '2', '3']
+
+
+def test_parse_page_without_cards(scraper):
+    assert scraper.parse_page('<html><body><p>empty</p></body></html>') == []
+
+
+@pytest.mark.parametrize('size', [1, 7, 64, 100000])
+def test_iter_cards_is_independent_of_chunk_boundaries(scraper, size):
+    html = build_page(count=9)
+    expected = scraper.parse_page(html)
+    chunks = (html[i:i + size] for i in range(0, len(html), size))
+    assert list(scraper.iter_cards(chunks)) == expected
+
+
+@pytest.mark.parametrize('size', [3, 1024])
+def test_iter_cards_decodes_bytes_using_meta_charset(scraper, size):
+    html = build_page(count=4)
+    data = html.encode('utf-8')
+    chunks = (data[i:i + size] for i in range(0, len(data), size))
+    assert list(scraper.iter_cards(chunks)) == scraper.parse_page(html)
+
+
+def test_iter_cards_yields_before_input_is_complete(scraper):
+    html = build_page(count=3)
+    cut = html.index('<div class="wapost card">', html.index('post/2.html'))
+
+    def chunks():
+        yield html[:cut]
+        # the first two cards are already closed when the parser asks for more
+        assert [r['post_id'] for r in seen] == ['1', '2']
+        yield html[cut:]
+
+    seen = []
+    for report in scraper.iter_cards(chunks()):
+        seen.append(report)
+    assert [r['post_id'] for r in seen] == ['1', '2', '3']
+
+
+def test_scrape_page_streams_from_client(scraper):
+    class StubClient:
+        def get_stream(self, url, decode_unicode=False):
+            assert decode_unicode
+            html = build_page(count=2)
+            return iter([html[:50], html[50:]])
+
+    scraper.client = StubClient()
+    assert [r['post_id'] for r in scraper.scrape_page('https://ipoipo.cn/tags-1.html')] == ['1', '2']
+
+
+def test_scrape_page_returns_empty_list_on_request_error(scraper):
+    class FailingClient:
+        def get_stream(self, url, decode_unicode=False):
+            raise OSError('connection refused')
+
+    scraper.client = FailingClient()
+    assert scraper.scrape_page('https://ipoipo.cn/tags-1.html') == []
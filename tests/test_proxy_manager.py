@@ -0,0 +1,100 @@
+"""
+Tests for ProxyManager's asynchronous node latency sweep.
+"""
+import socket
+
+import pytest
+
+from src.model import proxy_manager as proxy_manager_module
+from src.model.proxy_manager import ProxyManager
+
+CLASH_CONFIG = '''
+mixed-port: 7890
+proxies:
+  - {{name: alive, type: http, server: 127.0.0.1, port: {alive_port}}}
+  - {{name: dead, type: http, server: 127.0.0.1, port: {dead_port}}}
+'''
+
+
+def closed_port():
+    """A local port with nothing listening on it."""
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+@pytest.fixture
+def listener():
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    sock.listen()
+    yield sock
+    sock.close()
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch, listener):
+    monkeypatch.setattr(proxy_manager_module, 'PROXY_LATENCY_CACHE_PATH',
+                        tmp_path / 'proxy_latency.json')
+    config_path = tmp_path / 'clash.yaml'
+    config_path.write_text(CLASH_CONFIG.format(
+        alive_port=listener.getsockname()[1], dead_port=closed_port()
+    ), encoding='utf-8')
+    return ProxyManager(config_path=str(config_path))
+
+
+def nodes_by_name(manager):
+    return {node.name: node for node in manager.nodes}
+
+
+def test_test_all_nodes_records_latency_and_failures(manager):
+    manager.test_all_nodes()
+    nodes = nodes_by_name(manager)
+
+    assert nodes['alive'].latency < float('inf')
+    assert nodes['alive'].fail_count == 0
+    assert nodes['alive'].last_test_time > 0
+    assert nodes['dead'].latency == float('inf')
+    assert nodes['dead'].fail_count == 1
+    # fastest first
+    assert manager.nodes[0].name == 'alive'
+
+
+def test_failed_nodes_are_cached_and_skipped_on_next_start(manager, monkeypatch):
+    manager.test_all_nodes()
+
+    probed = []
+    original = ProxyManager._test_node_async
+
+    async def spy(self, node, semaphore):
+        probed.append(node.name)
+        return await original(self, node, semaphore)
+
+    monkeypatch.setattr(ProxyManager, '_test_node_async', spy)
+    restarted = ProxyManager(config_path=manager.config_path)
+    restarted.test_all_nodes()
+
+    assert probed == []
+    nodes = nodes_by_name(restarted)
+    assert nodes['dead'].latency == float('inf')
+    assert nodes['dead'].last_test_time > 0
+    assert nodes['alive'].latency < float('inf')
+
+
+def test_malformed_cache_entries_are_ignored(manager):
+    proxy_manager_module.PROXY_LATENCY_CACHE_PATH.write_text(
+        '{"alive": {"latency": 12.0, "fail_count": 0, "last_test_time": 9e99},'
+        ' "dead": {"latency": "fast"}}',
+        encoding='utf-8'
+    )
+    restarted = ProxyManager(config_path=manager.config_path)
+    nodes = nodes_by_name(restarted)
+    assert nodes['alive'].latency == 12.0
+    assert nodes['dead'].last_test_time == 0
+
+
+@pytest.mark.parametrize('content', ['[1, 2]', '{"alive": null}', 'not json'])
+def test_unusable_cache_file_does_not_break_startup(manager, content):
+    proxy_manager_module.PROXY_LATENCY_CACHE_PATH.write_text(content, encoding='utf-8')
+    restarted = ProxyManager(config_path=manager.config_path)
+    assert all(node.last_test_time == 0 for node in restarted.nodes)